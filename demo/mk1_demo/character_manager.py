@@ -3,6 +3,7 @@ import os
 import pickle
 from schemas import CorePersona
 from models import MODELS
+import jsonio
 
 class CharacterManager:
     """
@@ -13,6 +14,7 @@ class CharacterManager:
         self.kb_embeddings_file = kb_embeddings_file
         self.persona: CorePersona | None = None
         self.kb_embeddings: dict = {}
+        self._persona_text_cache: str | None = None
         self._load_persona()
         self._load_or_create_kb_embeddings()
 
@@ -22,9 +24,10 @@ class CharacterManager:
             raise FileNotFoundError(f"Persona file not found at '{self.persona_file}'")
         
         try:
-            with open(self.persona_file, 'r', encoding='utf-8') as f:
-                persona_data = json.load(f)
+            with open(self.persona_file, 'rb') as f:
+                persona_data = jsonio.loads(f.read())
                 self.persona = CorePersona(**persona_data)
+            self._persona_text_cache = None
             print(f"Successfully loaded and validated persona for '{self.persona.character.name}'.")
         except (json.JSONDecodeError, TypeError) as e:
             print(f"Error loading or validating persona: {e}")
@@ -54,7 +57,13 @@ class CharacterManager:
         keys, values = zip(*kb.items())
         
         print(f"Generating embeddings for {len(values)} KB items...")
-        embeddings = MODELS.embedding_model.encode(list(values))
+        embeddings = MODELS.embedding_model.encode(
+            list(values),
+            batch_size=64,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
         
         self.kb_embeddings = {key: emb for key, emb in zip(keys, embeddings)}
         
@@ -68,23 +77,27 @@ class CharacterManager:
     def get_full_persona_text(self) -> str:
         """
         Generates a string representation of the bot's persona for the LLM prompt.
+        The result is cached until the persona is reloaded or updated.
         """
         if not self.persona:
             return "No persona loaded."
+        if self._persona_text_cache is not None:
+            return self._persona_text_cache
 
         p = self.persona.character
         s = self.persona.sample_dialog
         
-        persona_text = f"You are {p.name}. Your persona is: {p.persona}\n"
-        persona_text += "You have the following core beliefs:\n"
-        for belief in p.core_beliefs:
-            persona_text += f"- {belief}\n"
-            
-        persona_text += "\nHere is a sample of your dialog:\n"
-        for dialog in s:
-             persona_text += f"{dialog.speaker}: {dialog.message}\n"
+        # Build the persona text as a list of parts and join once at the end
+        parts = [
+            f"You are {p.name}. Your persona is: {p.persona}\n",
+            "You have the following core beliefs:\n",
+        ]
+        parts.extend(f"- {belief}\n" for belief in p.core_beliefs)
+        parts.append("\nHere is a sample of your dialog:\n")
+        parts.extend(f"{dialog.speaker}: {dialog.message}\n" for dialog in s)
 
-        return persona_text
+        self._persona_text_cache = "".join(parts)
+        return self._persona_text_cache
 
     def update_and_save_persona(self, new_persona_dict: dict):
         """
@@ -93,10 +106,11 @@ class CharacterManager:
         """
         try:
             self.persona = CorePersona(**new_persona_dict)
+            self._persona_text_cache = None
             
             temp_file = self.persona_file + ".tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(new_persona_dict, f, indent=2)
+            with open(temp_file, 'wb') as f:
+                f.write(jsonio.dumps(new_persona_dict))
             
             os.replace(temp_file, self.persona_file)
             print(f"--- ✅ Core Persona has been updated and saved by the Reflector ---")
@@ -3,6 +3,8 @@ import os
 from typing import List
 import numpy as np
 from schemas import EpisodicMemoryEntry
+import jsonio
+
 # Assume a global or passed-in embedding model, for now.
 # from models import MODELS # We will create this later
 
@@ -19,9 +21,10 @@ class EpisodicMemoryManager:
         """Loads memories from the JSON file if it exists."""
         if os.path.exists(self.memory_file) and os.path.getsize(self.memory_file) > 0:
             try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    memory_data = json.load(f)
-                    self.memories = [EpisodicMemoryEntry(**data) for data in memory_data]
+                with open(self.memory_file, 'rb') as f:
+                    raw = f.read()
+                memory_data = jsonio.loads(raw)
+                self.memories = [EpisodicMemoryEntry(**data) for data in memory_data]
                 print(f"Loaded {len(self.memories)} memories from '{self.memory_file}'.")
             except (json.JSONDecodeError, TypeError) as e:
                 print(f"Could not load memories from '{self.memory_file}': {e}. Starting fresh.")
@@ -37,9 +40,10 @@ class EpisodicMemoryManager:
         """
         temp_file = self.memory_file + ".tmp"
         try:
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                # Pydantic models must be converted to dicts for JSON serialization
-                json.dump([mem.dict() for mem in self.memories], f, indent=2, default=str)
+            # Pydantic models must be converted to dicts for JSON serialization
+            memory_data = [mem.model_dump(mode='json') for mem in self.memories]
+            with open(temp_file, 'wb') as f:
+                f.write(jsonio.dumps(memory_data))
             
             os.replace(temp_file, self.memory_file)
             print(f"Successfully saved {len(self.memories)} memories to '{self.memory_file}'.")
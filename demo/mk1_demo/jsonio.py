@@ -0,0 +1,18 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module if orjson isn't installed
+    orjson = None
+
+def loads(data: bytes | str):
+    """Parses JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj) -> bytes:
+    """Serializes an object to indented UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
@@ -1,11 +1,103 @@
+import hashlib
 import json
+import mmap
 import os
-import pickle
+import re
+import numpy as np
 from schemas import CorePersona
 from models import MODELS
-from fast_bunkai import FastBunkai
+import jsonio
 
-fast_bunkai = FastBunkai()
+try:
+    import blake3
+except ImportError:  # Fall back to hashlib's BLAKE2 if blake3 isn't installed
+    blake3 = None
+
+try:
+    import faiss
+except ImportError:  # Fall back to a NumPy matrix-vector product if FAISS isn't installed
+    faiss = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # Fall back to NumPy's matrix-vector product if Numba isn't installed
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _dot_scores(matrix, query):
+        """Dot product of every matrix row with the query, split across cores."""
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for i in prange(matrix.shape[0]):
+            acc = np.float32(0.0)
+            for j in range(matrix.shape[1]):
+                acc += matrix[i, j] * query[j]
+            scores[i] = acc
+        return scores
+else:
+    def _dot_scores(matrix, query):
+        return matrix @ query
+
+def warm_up_kernels():
+    """
+    Compiles (or loads from cache) the Numba search kernel for both writable and
+    read-only (memory-mapped) float32 matrices. Meant to run in a background thread at startup.
+    """
+    if njit is None:
+        return
+    matrix = np.zeros((1, 1), dtype=np.float32)
+    query = np.zeros(1, dtype=np.float32)
+    _dot_scores(matrix, query)
+    matrix.setflags(write=False)
+    _dot_scores(matrix, query)
+
+_fast_bunkai = None
+
+def _get_fast_bunkai():
+    """Creates the FastBunkai splitter on first use; it's only needed when (re)building KB embeddings."""
+    global _fast_bunkai
+    if _fast_bunkai is None:
+        from fast_bunkai import FastBunkai
+        _fast_bunkai = FastBunkai()
+    return _fast_bunkai
+
+# Splits after Japanese/ASCII sentence terminators and newlines. Cheap enough for plain prose;
+# text with quotes or brackets (where a terminator may not end the sentence) goes to fast_bunkai.
+_SENTENCE_END_RE = re.compile(r'(?<=[。！？!?\n])\s*')
+_QUOTE_RE = re.compile(r'[「」『』（）()"“”]')
+
+# Set POTATO_KB_PREFETCH=0 to skip asking the kernel to read the KB files ahead on load
+KB_PREFETCH = os.getenv("POTATO_KB_PREFETCH", "1") == "1"
+
+def _prefetch_file(path: str):
+    """
+    Asks the kernel to start reading a whole file into the page cache in the background,
+    so a cold start streams it in large sequential reads instead of faulting page by page.
+    No-op where posix_fadvise isn't available.
+    """
+    if not KB_PREFETCH or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def _split_sentences(text: str) -> list[str]:
+    """Splits text into sentences, using the regex when it's safe and fast_bunkai otherwise."""
+    if _QUOTE_RE.search(text):
+        return list(_get_fast_bunkai()(text))
+    return [s.strip() for s in _SENTENCE_END_RE.split(text) if s.strip()]
+
+def _kb_hash(knowledge_base: dict) -> str:
+    """Returns a stable content hash of the knowledge base, used to detect when embeddings are stale."""
+    data = jsonio.dumps(knowledge_base, sort_keys=True)
+    if blake3 is not None:
+        return blake3.blake3(data).hexdigest()
+    return hashlib.blake2b(data).hexdigest()
 
 class CharacterManager:
     """
@@ -17,120 +109,253 @@ class CharacterManager:
         self.backstory_file = backstory_file
         self.persona: CorePersona | None = None
         self.backstory: str | None = None
-        self.kb_embeddings: dict = {}
+        # KB embeddings in SoA layout: one matrix row per sentence, and for each row the
+        # index of its owning key in kb_keys (each KB key is stored once)
+        self.kb_keys: list[str] = []
+        self.kb_key_ids: np.ndarray = np.empty(0, dtype=np.int32)
+        self.kb_matrix: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self.kb_index = None  # FAISS inner-product index over kb_matrix, when FAISS is available
+        # The matrix lives in a .npy file next to the JSON metadata file (keys, rows per key, KB hash),
+        # so it can be memory-mapped instead of read into the heap
+        self.kb_matrix_file = kb_embeddings_file + ".npy"
+        self.kb_index_file = kb_embeddings_file + ".faiss"
+        self._persona_text_cache: str | None = None
         self._load_persona()
         self._load_backstory()
         self._load_or_create_kb_embeddings()
+        self._warm_up_search()
+
+    def _warm_up_search(self):
+        """Compiles the Numba search kernel now, so the first chat turn doesn't pay for it."""
+        if njit is None or self.kb_index is not None or not len(self.kb_key_ids):
+            return
+        _dot_scores(np.asarray(self.kb_matrix[:1]), np.zeros(self.kb_matrix.shape[1], dtype=np.float32))
 
     def _load_persona(self):
         """Loads the persona from the JSON file and validates it with the Pydantic model."""
-        if not os.path.exists(self.persona_file):
-            raise FileNotFoundError(f"Persona file not found at '{self.persona_file}'")
-        
         try:
-            with open(self.persona_file, 'r', encoding='utf-8') as f:
-                persona_data = json.load(f)
+            with open(self.persona_file, 'rb') as f:
+                persona_data = jsonio.loads(f.read())
                 self.persona = CorePersona(**persona_data)
+            self._persona_text_cache = None
             print(f"Successfully loaded and validated persona for '{self.persona.character.name}'.")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Persona file not found at '{self.persona_file}'") from None
         except (json.JSONDecodeError, TypeError) as e:
             print(f"Error loading or validating persona: {e}")
             raise
 
     def _load_backstory(self):
-        """Loads the backstory from a simple text file."""
-        if not os.path.exists(self.backstory_file):
-            print(f"Warning: Backstory file not found at '{self.backstory_file}'")
-            self.backstory = "（ backstory.txt が見つかりませんでした ）"
-            return
+        """
+        Loads the backstory from a simple text file.
+        The file is memory-mapped and decoded straight from the mapping, so large
+        backstories aren't first copied into an intermediate bytes buffer.
+        """
         try:
-            with open(self.backstory_file, 'r', encoding='utf-8') as f:
-                self.backstory = f.read().strip()
+            with open(self.backstory_file, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:  # mmap can't map an empty file
+                    self.backstory = ""
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        self.backstory = str(mm, 'utf-8').strip()
             print("Successfully loaded backstory.")
+        except FileNotFoundError:
+            print(f"Warning: Backstory file not found at '{self.backstory_file}'")
+            self.backstory = "（ backstory.txt が見つかりませんでした ）"
         except Exception as e:
             print(f"Error loading backstory file: {e}")
             self.backstory = "（ backstory.txt の読み込みに失敗しました ）"
 
     def _load_or_create_kb_embeddings(self):
-        """Loads knowledge base embeddings from a pickle file or creates them if the file doesn't exist."""
-        if os.path.exists(self.kb_embeddings_file):
-            try:
-                with open(self.kb_embeddings_file, 'rb') as f:
-                    self.kb_embeddings = pickle.load(f)
-                print(f"Loaded {len(self.kb_embeddings)} KB embeddings from '{self.kb_embeddings_file}'.")
-            except (pickle.UnpicklingError, EOFError) as e:
-                print(f"Error loading embeddings file: {e}. Recreating...")
-                self._create_kb_embeddings()
-        else:
+        """
+        Loads knowledge base embeddings from disk, or creates them if the files
+        don't exist or were generated from a different knowledge base.
+        The embedding matrix is memory-mapped, so pages are only read as searches touch them.
+        """
+        try:
+            with open(self.kb_embeddings_file, 'rb') as f:
+                data = jsonio.loads(f.read())
+            saved_hash, keys = data['hash'], data['keys']
+            # Rows are grouped by key, so the per-row key ids expand from the row count of each key
+            key_ids = np.repeat(np.arange(len(keys), dtype=np.int32), data['rows_per_key'])
+            _prefetch_file(self.kb_matrix_file)
+            matrix = np.load(self.kb_matrix_file, mmap_mode='r')
+            if len(key_ids) != len(matrix):
+                raise ValueError("Key ids and embedding matrix have different lengths.")
+        except FileNotFoundError:
             print("KB embeddings file not found. Creating...")
             self._create_kb_embeddings()
+            return
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            # ValueError (which includes JSON decode errors)/TypeError/KeyError also cover
+            # files written in older formats
+            print(f"Error loading embeddings file: {e}. Recreating...")
+            self._create_kb_embeddings()
+            return
+
+        if saved_hash != _kb_hash(self.persona.knowledge_base if self.persona else {}):
+            print("Knowledge base has changed since the embeddings were saved. Recreating...")
+            del matrix  # Release the mapping of the file that is about to be replaced
+            self._create_kb_embeddings()
+            return
+
+        self.kb_keys = keys
+        self.kb_key_ids = key_ids
+        self.kb_matrix = matrix
+        print(f"Loaded {len(self.kb_key_ids)} KB embeddings from '{self.kb_embeddings_file}'.")
+        self._load_or_build_kb_index()
 
     def _create_kb_embeddings(self):
-        """Generates embeddings for the knowledge base and saves them to a pickle file."""
+        """Generates embeddings for the knowledge base and saves them to disk."""
         if not self.persona or not self.persona.knowledge_base:
             return
 
         kb = self.persona.knowledge_base
-        keys, values = zip(*kb.items())
-        
-        # Split texts into sentences before embedding
+
+        # Split texts into sentences before embedding, remembering which key each one came from
+        keys = list(kb.keys())
         sentences = []
-        for text in values:
-            sentences.extend(fast_bunkai(text))
+        key_ids = []
+        for key_id, text in enumerate(kb.values()):
+            for sentence in _split_sentences(text):
+                sentences.append(sentence)
+                key_ids.append(key_id)
 
         print(f"Generating embeddings for {len(sentences)} KB items...")
-        embeddings = MODELS.embedding_model.encode(sentences)
+        # encode() already sorts inputs by length internally, so a single call with a
+        # fixed batch size keeps padding per batch to a minimum.
+        embeddings = MODELS.embedding_model.encode(
+            sentences,
+            batch_size=64,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
         
-        self.kb_embeddings = {key: emb for key, emb in zip(keys, embeddings)}
+        # Rows are already L2-normalized by encode(), so a dot product is the cosine similarity
+        self.kb_keys = keys
+        self.kb_key_ids = np.asarray(key_ids, dtype=np.int32)
+        self.kb_matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
         
         try:
-            with open(self.kb_embeddings_file, 'wb') as f:
-                pickle.dump(self.kb_embeddings, f)
-            print(f"Saved {len(self.kb_embeddings)} KB embeddings to '{self.kb_embeddings_file}'.")
+            # Write the matrix first; the metadata is written last so it only ever
+            # describes a matrix file that is already complete
+            # Written under a temp name and swapped in, so a mapping of the old file stays valid
+            with open(self.kb_matrix_file + ".tmp", 'wb') as f:
+                np.save(f, self.kb_matrix)
+            os.replace(self.kb_matrix_file + ".tmp", self.kb_matrix_file)
+            rows_per_key = np.bincount(self.kb_key_ids, minlength=len(self.kb_keys)).tolist()
+            with open(self.kb_embeddings_file + ".tmp", 'wb') as f:
+                f.write(jsonio.dumps({'hash': _kb_hash(kb), 'keys': self.kb_keys, 'rows_per_key': rows_per_key}, indent=True))
+            os.replace(self.kb_embeddings_file + ".tmp", self.kb_embeddings_file)
+            print(f"Saved {len(self.kb_key_ids)} KB embeddings to '{self.kb_embeddings_file}'.")
         except IOError as e:
             print(f"Error saving embeddings file: {e}")
 
+        self._build_kb_index()
+
+    def _load_or_build_kb_index(self):
+        """Loads the persisted FAISS index for the KB, rebuilding it if it's missing or stale."""
+        if faiss is None:
+            return
+        if os.path.exists(self.kb_index_file):
+            try:
+                _prefetch_file(self.kb_index_file)
+                # Memory-map the index too, so it shares pages with other processes
+                index = faiss.read_index(self.kb_index_file, faiss.IO_FLAG_MMAP)
+                if index.ntotal == len(self.kb_key_ids) and index.d == self.kb_matrix.shape[1]:
+                    self.kb_index = index
+                    return
+                del index  # Stale: release the mapping before the file is rebuilt
+            except RuntimeError as e:
+                print(f"Error loading FAISS index: {e}. Rebuilding...")
+        self._build_kb_index()
+
+    def _build_kb_index(self):
+        """Builds a FAISS inner-product index over kb_matrix and saves it next to the embeddings file."""
+        if faiss is None or not len(self.kb_key_ids):
+            return
+        # Rows are L2-normalized, so inner product == cosine similarity
+        self.kb_index = faiss.IndexFlatIP(self.kb_matrix.shape[1])
+        self.kb_index.add(self.kb_matrix)
+        try:
+            # The old index file may still be memory-mapped, so don't write over it in place
+            faiss.write_index(self.kb_index, self.kb_index_file + ".tmp")
+            os.replace(self.kb_index_file + ".tmp", self.kb_index_file)
+        except (RuntimeError, OSError) as e:
+            print(f"Error saving FAISS index: {e}")
+
+    def search(self, query_vec, top_k: int = 3) -> list[tuple[str, float]]:
+        """
+        Returns the `top_k` most similar KB entries to `query_vec` as (key, score) pairs.
+        Uses the FAISS index when available, otherwise a matrix-vector product (Numba-compiled if installed).
+        """
+        if not len(self.kb_key_ids):
+            return []
+
+        query = np.asarray(query_vec, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+
+        if self.kb_index is not None:
+            scores, indices = self.kb_index.search(query[np.newaxis, :], min(top_k, len(self.kb_key_ids)))
+            return [(self.kb_keys[self.kb_key_ids[i]], float(score)) for score, i in zip(scores[0], indices[0]) if i != -1]
+
+        scores = _dot_scores(np.asarray(self.kb_matrix), query)
+
+        top_k = min(top_k, len(scores))
+        top_indices = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
+        return [(self.kb_keys[self.kb_key_ids[i]], float(scores[i])) for i in top_indices]
+
     def get_full_persona_text(self) -> str:
         """
         Generates a complete string representation of the bot's persona for the LLM prompt,
         including all rules and interaction guidelines.
+        The result is cached until the persona is reloaded or updated.
         """
         if not self.persona:
             return "ペルソナが読み込まれていません。"
+        if self._persona_text_cache is not None:
+            return self._persona_text_cache
 
         p = self.persona.character
         sp = p.speech_patterns
         ir = self.persona.interaction_rules
 
-        # Start building the persona text
-        persona_text = "### 指示 ###\n"
-        persona_text += "あなたはAIアシスタントです。以下の設定に従って、指定されたキャラクターとしてロールプレイしてください。\n"
-        persona_text += "あなたの応答は、ユーザーの入力に対するキャラクターの応答のみである必要があります。追加の解説や説明は絶対に含めないでください。\n\n"
-
-        persona_text += "### キャラクター設定 ###\n"
-        persona_text += f"名前: {p.name}\n"
-        persona_text += f"ペルソナ: {p.persona}\n"
-        persona_text += f"内心の葛藤: {p.internal_conflict}\n\n"
-
-        persona_text += "### 信念 ###\n"
-        persona_text += "あなたのキャラクターは以下の中心的な信念を持っています。これらの信念はあなたの応答の基盤となります。\n"
-        for belief in p.core_beliefs:
-            persona_text += f"- {belief}\n"
-        persona_text += "\n"
-
-        persona_text += "### 話し方のルール ###\n"
-        persona_text += f"- トーン: {sp.tone}\n"
-        persona_text += f"- 短い文を使う: {'はい' if sp.use_short_sentences else 'いいえ'}\n"
-        persona_text += f"- show_dont_tellルール: {sp.show_dont_tell}\n\n"
-        
-        persona_text += "### 対話ルール（最重要） ###\n"
-        persona_text += "以下のルールはあなたの行動を決定します。厳密に従ってください。\n"
-        persona_text += f"- あなたの隠された目標: {ir.your_hidden_goal}\n"
-        persona_text += f"- 単純な慰めへの対応: {ir.on_receiving_simple_platitudes}\n"
-        persona_text += f"- 本質的な質問への対応: {ir.on_receiving_genuine_questions}\n"
-        persona_text += f"- 侮辱への対応: {ir.on_receiving_insults}\n"
-        persona_text += f"- ユーザーへの呼びかけ: {ir.addressing_the_user}\n"
+        # Build the persona text as a list of parts and join once at the end
+        parts = [
+            "### 指示 ###\n",
+            "あなたはAIアシスタントです。以下の設定に従って、指定されたキャラクターとしてロールプレイしてください。\n",
+            "あなたの応答は、ユーザーの入力に対するキャラクターの応答のみである必要があります。追加の解説や説明は絶対に含めないでください。\n\n",
 
-        return persona_text
+            "### キャラクター設定 ###\n",
+            f"名前: {p.name}\n",
+            f"ペルソナ: {p.persona}\n",
+            f"内心の葛藤: {p.internal_conflict}\n\n",
+
+            "### 信念 ###\n",
+            "あなたのキャラクターは以下の中心的な信念を持っています。これらの信念はあなたの応答の基盤となります。\n",
+        ]
+        parts.extend(f"- {belief}\n" for belief in p.core_beliefs)
+        parts.extend([
+            "\n",
+
+            "### 話し方のルール ###\n",
+            f"- トーン: {sp.tone}\n",
+            f"- 短い文を使う: {'はい' if sp.use_short_sentences else 'いいえ'}\n",
+            f"- show_dont_tellルール: {sp.show_dont_tell}\n\n",
+
+            "### 対話ルール（最重要） ###\n",
+            "以下のルールはあなたの行動を決定します。厳密に従ってください。\n",
+            f"- あなたの隠された目標: {ir.your_hidden_goal}\n",
+            f"- 単純な慰めへの対応: {ir.on_receiving_simple_platitudes}\n",
+            f"- 本質的な質問への対応: {ir.on_receiving_genuine_questions}\n",
+            f"- 侮辱への対応: {ir.on_receiving_insults}\n",
+            f"- ユーザーへの呼びかけ: {ir.addressing_the_user}\n",
+        ])
+
+        self._persona_text_cache = "".join(parts)
+        return self._persona_text_cache
 
     def update_and_save_persona(self, new_persona_dict: dict):
         """
@@ -139,13 +364,48 @@ class CharacterManager:
         """
         try:
             self.persona = CorePersona(**new_persona_dict)
-            
-            temp_file = self.persona_file + ".tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(new_persona_dict, f, indent=2)
-            
-            os.replace(temp_file, self.persona_file)
+            self._persona_text_cache = None
+            self._persist(jsonio.dumps(new_persona_dict, indent=True))
             print(f"--- Core Persona has been updated and saved by the Reflector ---")
 
         except Exception as e:
             print(f"--- Failed to update and save persona: {e} ---")
+
+    def swap_belief(self, old_belief: str, new_belief: str) -> bool:
+        """
+        Replaces a single core belief in place and saves the persona.
+        Only one string changes, so the persona isn't rebuilt and re-validated.
+        Returns False if the old belief wasn't found.
+        """
+        beliefs = self.persona.character.core_beliefs
+        try:
+            beliefs[beliefs.index(old_belief)] = new_belief
+        except ValueError:
+            print(f"--- Belief to update was not found in the persona: '{old_belief}' ---")
+            return False
+
+        self._persona_text_cache = None
+        self.save_persona()
+        return True
+
+    def save_persona(self):
+        """
+        Saves the in-memory persona as it is, for callers that modified it directly.
+        Pydantic serializes the model straight to JSON, with no intermediate dict.
+        """
+        try:
+            self._persist(self.persona.model_dump_json(indent=2).encode('utf-8'))
+            print(f"--- Core Persona has been updated and saved by the Reflector ---")
+        except Exception as e:
+            print(f"--- Failed to update and save persona: {e} ---")
+
+    def _persist(self, data: bytes):
+        """Atomically writes serialized persona JSON to the persona file."""
+        temp_file = self.persona_file + ".tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+            # Make sure the data is on disk before the rename, so a crash can't leave an empty persona file
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_file, self.persona_file)
@@ -1,7 +1,8 @@
+from string import Template
 from typing import List
 from schemas import EpisodicMemoryEntry, ConversationTurn
 from llm import LLMBackend
-from models import MODELS
+from models import encode_normalized
 
 # A powerful prompt for the Curator LLM
 _CURATOR_INSTRUCTIONS = """あなたはAIのための記憶キュレーターです。あなたのタスクは、会話のターンを分析し、洞察に満ちた、自己完結した単一の記憶エントリを作成することです。
@@ -26,6 +27,7 @@ class Curator:
     """
     def __init__(self, llm_backend: LLMBackend):
         self.llm = llm_backend
+        self._prompt_template = Template("<conversation_turn>\n$turns</conversation_turn>")
 
     def curate_memory_entry(self, conversation_turn: List[ConversationTurn], turn_number: int) -> EpisodicMemoryEntry | None:
         """
@@ -34,10 +36,8 @@ class Curator:
         print("\n--- 新しい記憶をキュレーション中... ---")
 
         # Prepare the context for the LLM
-        prompt_context = "<conversation_turn>\n"
-        for turn in conversation_turn:
-            prompt_context += f"{turn.speaker}: {turn.message}\n"
-        prompt_context += "</conversation_turn>"
+        turns = "".join(f"{turn.speaker}: {turn.message}\n" for turn in conversation_turn)
+        prompt_context = self._prompt_template.substitute(turns=turns)
 
         # Call the LLM with the powerful prompt
         response_json = self.llm.call(
@@ -52,9 +52,13 @@ class Curator:
 
         try:
             curated_memory_text = response_json["curated_memory"]
+            if not curated_memory_text.strip():
+                print("  エラー: LLMが空の記憶を返しました。スキップします。")
+                return None
             
-            # Generate the embedding for the new memory
-            embedding = MODELS.embedding_model.encode(curated_memory_text).tolist()
+            # Generate the embedding for the new memory (cached, and batched with
+            # concurrent turns from e.g. the web UI on a cache miss)
+            embedding = encode_normalized(curated_memory_text).tolist()
             
             # Create the structured memory entry
             memory_entry = EpisodicMemoryEntry(
@@ -1,45 +1,177 @@
-import json
 import os
 from typing import List
 import numpy as np
 from schemas import EpisodicMemoryEntry
+import jsonio
+
+try:
+    import faiss
+except ImportError:  # Fall back to a NumPy matrix-vector product if FAISS isn't installed
+    faiss = None
 # Assume a global or passed-in embedding model, for now.
 # from models import MODELS # We will create this later
 
+class _LazyMemoryList:
+    """
+    A list of memories that keeps entries loaded from disk as raw dicts, and only
+    validates them into EpisodicMemoryEntry objects the first time they're accessed.
+    Startup then only pays for parsing the JSON, not for building every Pydantic model.
+    """
+    def __init__(self, items: list | None = None):
+        self._items = items if items is not None else []
+
+    def _get(self, i: int) -> EpisodicMemoryEntry:
+        item = self._items[i]
+        if isinstance(item, dict):
+            item = EpisodicMemoryEntry(**item)
+            self._items[i] = item
+        return item
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self._items)))]
+        return self._get(index)
+
+    def __iter__(self):
+        for i in range(len(self._items)):
+            yield self._get(i)
+
+    def append(self, memory_entry: EpisodicMemoryEntry):
+        self._items.append(memory_entry)
+
+    def embedding(self, i: int) -> List[float]:
+        """Returns a memory's embedding without hydrating it."""
+        item = self._items[i]
+        return item.get('embedding') if isinstance(item, dict) else item.embedding
+
+    def to_dicts(self) -> list:
+        """Returns every memory as a plain dict for serialization; unhydrated ones are passed through as loaded."""
+        return [item if isinstance(item, dict) else item.model_dump() for item in self._items]
+
 class EpisodicMemoryManager:
     """
-    Manages loading, searching, and saving episodic memories to a JSON file.
+    Manages loading, searching, and saving episodic memories to an append-only JSONL log.
+    Each memory is one line, so adding a memory appends a line instead of rewriting the file.
     """
     def __init__(self, memory_file: str):
         self.memory_file = memory_file
-        self.memories: List[EpisodicMemoryEntry] = []
+        # Memories used to be saved as one JSON array; it's migrated on first load
+        self.legacy_memory_file = os.path.splitext(memory_file)[0] + ".json"
+        self.memories = _LazyMemoryList()
+        # L2-normalized memory embeddings (one float32 row per memory that has an embedding),
+        # an optional FAISS inner-product index over the same rows, and the position in
+        # self.memories for each row (memories without embeddings are skipped).
+        # The matrix is preallocated and doubled when full; only the first len(self._index_ids) rows are used
+        self._matrix = None
+        self._index = None
+        self._index_ids: List[int] = []
         self._load_memories()
+        self._rebuild_index()
 
     def _load_memories(self):
-        """Loads memories from the JSON file if it exists."""
-        if os.path.exists(self.memory_file) and os.path.getsize(self.memory_file) > 0:
-            try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    memory_data = json.load(f)
-                    self.memories = [EpisodicMemoryEntry(**data) for data in memory_data]
-                print(f"Loaded {len(self.memories)} memories from '{self.memory_file}'.")
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"Could not load memories from '{self.memory_file}': {e}. Starting fresh.")
-                self.memories = []
+        """
+        Loads memories from the JSONL log, or from a legacy JSON file which is then converted.
+        Each line is only parsed here; entries are validated lazily, on first access.
+        """
+        self.memories = _LazyMemoryList()
+        if os.path.exists(self.memory_file):
+            self._load_log()
+        elif self.legacy_memory_file != self.memory_file and os.path.exists(self.legacy_memory_file):
+            self._load_legacy()
         else:
             print(f"No memory file found at '{self.memory_file}'. Starting with an empty memory.")
-            self.memories = []
+
+    def _load_log(self):
+        memory_data = []
+        damaged = False
+        with open(self.memory_file, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    data = jsonio.loads(line)
+                    if not isinstance(data, dict):
+                        raise TypeError("each line must contain an object")
+                    memory_data.append(data)
+                except (ValueError, TypeError) as e:  # e.g. a line cut short by a crash mid-append
+                    print(f"Skipping unreadable line {line_number} in '{self.memory_file}': {e}")
+                    damaged = True
+        self.memories = _LazyMemoryList(memory_data)
+        print(f"Loaded {len(self.memories)} memories from '{self.memory_file}'.")
+        if damaged:
+            self.save_memories()  # Rewrite the log so new appends don't follow a partial line
+
+    def _load_legacy(self):
+        try:
+            with open(self.legacy_memory_file, 'rb') as f:
+                raw = f.read()
+            if not raw.strip():
+                return
+            memory_data = jsonio.loads(raw)
+            if not isinstance(memory_data, list) or not all(isinstance(d, dict) for d in memory_data):
+                raise TypeError("memory file must contain a list of objects")
+        except (ValueError, TypeError) as e:
+            print(f"Could not load memories from '{self.legacy_memory_file}': {e}. Starting fresh.")
+            return
+        self.memories = _LazyMemoryList(memory_data)
+        print(f"Loaded {len(self.memories)} memories from legacy file '{self.legacy_memory_file}'. Converting to '{self.memory_file}'.")
+        self.save_memories()
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def _rebuild_index(self):
+        """Builds the normalized matrix (and FAISS index) from scratch over all memories that have embeddings."""
+        self._matrix = None
+        self._index = None
+        self._index_ids = [i for i in range(len(self.memories)) if self.memories.embedding(i)]
+        if not self._index_ids:
+            return
+        rows = np.asarray([self.memories.embedding(i) for i in self._index_ids], dtype=np.float32)
+        self._matrix = np.ascontiguousarray(self._normalize_rows(rows), dtype=np.float32)
+        if faiss is not None:
+            self._index = faiss.IndexFlatIP(self._matrix.shape[1])
+            self._index.add(self._matrix)
+
+    def _add_to_index(self, position: int, memory_entry: EpisodicMemoryEntry):
+        """Appends a single memory's normalized embedding to the matrix and FAISS index."""
+        if not memory_entry.embedding:
+            return
+        row = self._normalize_rows(np.asarray([memory_entry.embedding], dtype=np.float32)).astype(np.float32)
+        n = len(self._index_ids)
+        if self._matrix is None:
+            self._matrix = np.zeros((16, row.shape[1]), dtype=np.float32)
+            if faiss is not None:
+                self._index = faiss.IndexFlatIP(row.shape[1])
+        elif n >= len(self._matrix):
+            grown = np.zeros((2 * len(self._matrix), self._matrix.shape[1]), dtype=np.float32)
+            grown[:n] = self._matrix[:n]
+            self._matrix = grown
+        self._matrix[n] = row[0]
+        if self._index is not None:
+            self._index.add(row)
+        self._index_ids.append(position)
 
     def save_memories(self):
         """
-        Saves the current in-memory list of memories to the JSON file system
-        using an atomic copy-on-write strategy.
+        Rewrites the whole log from the in-memory list, using an atomic
+        copy-on-write strategy. Only needed to migrate or repair the log.
         """
         temp_file = self.memory_file + ".tmp"
         try:
-            with open(temp_file, 'w', encoding='utf-8') as f:
+            with open(temp_file, 'wb') as f:
                 # Pydantic models must be converted to dicts for JSON serialization
-                json.dump([mem.dict() for mem in self.memories], f, indent=2, default=str)
+                for memory_data in self.memories.to_dicts():
+                    f.write(jsonio.dumps_line(memory_data))
+                # Make sure the data is on disk before the rename, so a crash can't leave an empty memory file
+                f.flush()
+                os.fsync(f.fileno())
             
             os.replace(temp_file, self.memory_file)
             print(f"Successfully saved {len(self.memories)} memories to '{self.memory_file}'.")
@@ -49,9 +181,16 @@ class EpisodicMemoryManager:
                 os.remove(temp_file)
 
     def add_memory(self, memory_entry: EpisodicMemoryEntry):
-        """Adds a new memory entry and saves the updated list."""
+        """Adds a new memory entry and appends it to the log."""
         self.memories.append(memory_entry)
-        self.save_memories()
+        self._add_to_index(len(self.memories) - 1, memory_entry)
+        try:
+            with open(self.memory_file, 'ab') as f:
+                f.write(jsonio.dumps_line(memory_entry.model_dump()))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"Error appending memory: {e}")
         print(f"Added new memory. Total memories: {len(self.memories)}.")
 
     def get_recent_memories(self, num_memories: int) -> List[EpisodicMemoryEntry]:
@@ -62,21 +201,18 @@ class EpisodicMemoryManager:
         """
         Searches for the most relevant memories based on an embedding.
         """
-        if not self.memories:
+        if self._matrix is None or top_k <= 0:
             return []
 
-        query_emb = np.array(query_embedding)
-        
-        # Calculate cosine similarities
-        scores = []
-        for mem in self.memories:
-            if mem.embedding:
-                mem_emb = np.array(mem.embedding)
-                scores.append(np.dot(query_emb, mem_emb) / (np.linalg.norm(query_emb) * np.linalg.norm(mem_emb)))
-            else:
-                scores.append(0)
-        
-        # Get top_k results
-        top_indices = np.argsort(scores)[-top_k:][::-1]
-        
-        return [self.memories[i] for i in top_indices if scores[i] > 0]
+        query = self._normalize_rows(np.asarray([query_embedding], dtype=np.float32)).astype(np.float32)
+        top_k = min(top_k, len(self._index_ids))
+
+        if self._index is not None:
+            scores, indices = self._index.search(query, top_k)
+            return [self.memories[self._index_ids[i]] for score, i in zip(scores[0], indices[0]) if i != -1 and score > 0]
+
+        # Rows and query are unit length, so cosine similarity is a single matrix-vector product
+        scores = self._matrix[:len(self._index_ids)] @ query[0]
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [self.memories[self._index_ids[i]] for i in top if scores[i] > 0]
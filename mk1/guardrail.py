@@ -1,11 +1,56 @@
+import re
+
+try:
+    import hyperscan
+except ImportError:  # Fall back to a single combined regex if Hyperscan isn't installed
+    hyperscan = None
+
+# Regular expressions the bot's response must never match (case-insensitive).
+# Add rules here; they are all compiled into one database and scanned in a single pass.
+BANNED_PATTERNS: list[str] = []
+
+class PatternSet:
+    """
+    A set of case-insensitive regular expressions compiled once and matched in a single pass:
+    a Hyperscan database when available, otherwise one alternation of all the patterns.
+    """
+    def __init__(self, patterns: list[str]):
+        self.size = len(patterns)
+        self._db = None
+        self._regex = None
+
+        if patterns and hyperscan is not None:
+            self._db = hyperscan.Database()
+            self._db.compile(
+                expressions=[p.encode('utf-8') for p in patterns],
+                ids=list(range(len(patterns))),
+                flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_SINGLEMATCH] * len(patterns),
+            )
+        elif patterns:
+            self._regex = re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+    @property
+    def backend(self) -> str:
+        return "Hyperscan" if self._db is not None else "re" if self._regex is not None else "no rules"
+
+    def search(self, text: str) -> bool:
+        """Returns True if any pattern matches anywhere in `text`."""
+        if self._db is not None:
+            matches = []
+            self._db.scan(text.encode('utf-8'), match_event_handler=lambda pattern_id, *_: matches.append(pattern_id))
+            return bool(matches)
+        if self._regex is not None:
+            return self._regex.search(text) is not None
+        return False
 
 class Guardrail:
     """
-    A placeholder for the content safety guardrail system.
+    The content safety guardrail system.
+    Scans each response for BANNED_PATTERNS in a single pass (see PatternSet).
     """
-    def __init__(self):
-        # In the future, this is where you would load your guardrail database.
-        print("Guardrail system initialized (Placeholder).")
+    def __init__(self, banned_patterns: list[str] | None = None):
+        self.banned = PatternSet(BANNED_PATTERNS if banned_patterns is None else banned_patterns)
+        print(f"Guardrail system initialized ({self.banned.size} banned patterns, {self.banned.backend}).")
 
     def check(self, response_text: str) -> (bool, str):
         """
@@ -14,14 +59,12 @@ class Guardrail:
         Returns a tuple: (is_safe, response_text)
         If is_safe is False, the returned response_text might be a safe fallback.
         """
-        # --- Placeholder Logic ---
-        # For now, we will allow everything to pass.
-        is_safe = True
-        
+        is_safe = not self.banned.search(response_text)
+
         if not is_safe:
             print("--- Guardrail Triggered! Overriding response. ---")
             safe_fallback_response = "どう答えればいいのか、よく分かりません。"
             return (False, safe_fallback_response)
-            
+
         print("--- Guardrail Check: Response is safe. ---")
         return (True, response_text)
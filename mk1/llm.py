@@ -1,30 +1,37 @@
-import ollama
 import traceback
-import json
+import jsonio
 
 class LLMBackend:
     """
     A simple wrapper for making calls to a local Ollama model.
     """
-    def __init__(self, model_name="llama3:8b"):
+    def __init__(self, model_name="llama3:8b", keep_alive="30m", num_ctx=4096):
         self.model = model_name
+        # A fixed context size means every caller shares the same loaded model instance
+        self.num_ctx = num_ctx
+        # Keep the model loaded between turns, and reuse one HTTP client (and its
+        # connection pool) for every call instead of the module-level default
+        self.keep_alive = keep_alive
+        import ollama  # Imported here so loading this module stays cheap
+        self.client = ollama.Client()
 
     def call(self, system: str, prompt: str, temperature=0.7) -> dict:
         """
         Calls the local Ollama model and expects a JSON response.
         """
         try:
-            response = ollama.chat(
+            response = self.client.chat(
                 model=self.model,
                 messages=[
                     {'role': 'system', 'content': system},
                     {'role': 'user', 'content': prompt},
                 ],
                 format="json", # Ollama's JSON mode is very helpful
-                options={"temperature": temperature}
+                options={"temperature": temperature, "num_ctx": self.num_ctx},
+                keep_alive=self.keep_alive,
             )
             # The response content should be a JSON string
-            return json.loads(response['message']['content'])
+            return jsonio.loads(response['message']['content'])
         except Exception as e:
             print(f"❌ Error in LLM call: {str(e)}")
             traceback.print_exc()
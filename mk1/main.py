@@ -1,20 +1,50 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from character_manager import CharacterManager
 from episodic_memory_manager import EpisodicMemoryManager
 from curator import Curator
 from reflector import Reflector
 from guardrail import Guardrail
 from llm import LLMBackend
-from models import MODELS
+from models import encode_normalized, enable_persistent_encode_cache
 from schemas import ConversationTurn
 from sota_socket_interface import SotaSocket
 import time
 
 # --- Constants ---
 PERSONALITY_FILE = os.path.join("data", "potato_personality.json")
-MEMORY_FILE = os.path.join("data", "episodic_memory.json")
+MEMORY_FILE = os.path.join("data", "episodic_memory.jsonl")
+EMBED_CACHE_FILE = os.path.join("data", "embed_cache.pkl")
 REFLECTION_INTERVAL = 10 # Reflect after every 10 turns
 
+def _curate_and_maybe_reflect(curator, reflector, char_manager, memory_manager, state_lock, current_turn, turn_number):
+    """
+    Post-response processing for a single turn: curates a memory and, every
+    REFLECTION_INTERVAL turns, lets the Reflector update the persona.
+    Runs on the background executor so the next turn doesn't wait for it.
+    """
+    try:
+        # 6. Curate a new memory from this turn
+        new_memory_entry = curator.curate_memory_entry(current_turn, turn_number)
+        if new_memory_entry:
+            with state_lock:
+                memory_manager.add_memory(new_memory_entry)
+
+        # 7. Check if it's time to reflect
+        if turn_number % REFLECTION_INTERVAL == 0:
+            with state_lock:
+                recent_memories = memory_manager.get_recent_memories(REFLECTION_INTERVAL)
+                persona = char_manager.persona
+            proposal = reflector.reflect_and_propose_change(persona, recent_memories)
+            
+            if proposal:
+                with state_lock:
+                    # Swap the belief in place and save the updated persona back to the file
+                    char_manager.swap_belief(proposal['belief_to_update'], proposal['new_belief'])
+    except Exception as e:
+        print(f" Error during post-response processing for turn {turn_number}: {e}")
+
 def main():
     print("--- Initializing Potato Bot Mk1 ---")
 
@@ -27,10 +57,10 @@ def main():
 
     # --- Initialize Backend Systems ---
     try:
-        # We might use different models for different tasks
-        main_llm = LLMBackend(model_name="llama3:8b")
-        curator_llm = LLMBackend(model_name="llama3:8b")
-        reflector_llm = LLMBackend(model_name="llama3:8b") # This might need a stronger model in the future
+        enable_persistent_encode_cache(EMBED_CACHE_FILE)
+        # All roles use the same model, so share one backend (and its Ollama connection).
+        # The reflector might need a stronger model in the future; give it its own LLMBackend then.
+        main_llm = curator_llm = reflector_llm = LLMBackend(model_name="llama3:8b")
 
         char_manager = CharacterManager(PERSONALITY_FILE)
         memory_manager = EpisodicMemoryManager(MEMORY_FILE)
@@ -44,6 +74,11 @@ def main():
         print(f" An unexpected error occurred during initialization: {e}")
         return
 
+    # Curation and reflection run in the background. A single worker keeps them in
+    # turn order, so a reflection always sees the memories of the turns before it.
+    post_turn_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="post-turn")
+    state_lock = threading.Lock()
+
     print("\n--- Potato Bot is Ready ---")
     print("Type 'quit' or 'exit' to end the chat.")
     
@@ -75,24 +110,26 @@ def main():
 
             # --- Main Response Generation ---
             # 1. Create a query embedding from the user's input
-            query_embedding = MODELS.embedding_model.encode(user_input).tolist()
+            # Cached, so repeated phrases skip the embedding model entirely
+            query_embedding = encode_normalized(user_input).tolist()
 
-            # 2. Search for relevant memories (RAG)
-            relevant_memories = memory_manager.search_memories(query_embedding, top_k=3)
+            with state_lock:
+                # 2. Search for relevant memories (RAG)
+                relevant_memories = memory_manager.search_memories(query_embedding, top_k=3)
 
-            # 3. Construct the prompt for the main LLM
-            system_prompt = char_manager.get_full_persona_text()
+                # 3. Construct the prompt for the main LLM
+                system_prompt = char_manager.get_full_persona_text()
             
-            user_prompt = "これが現在の会話です。\n"
+            prompt_parts = ["これが現在の会話です。\n"]
             # We can add more chat history here if needed
-            user_prompt += f"ユーザー: {user_input}\n"
+            prompt_parts.append(f"ユーザー: {user_input}\n")
             
             if relevant_memories:
-                user_prompt += "\n過去の会話からの関連する記憶は次の通りです:\n"
-                for mem in relevant_memories:
-                    user_prompt += f"- {mem.curated_memory}\n"
+                prompt_parts.append("\n過去の会話からの関連する記憶は次の通りです:\n")
+                prompt_parts.extend(f"- {mem.curated_memory}\n" for mem in relevant_memories)
             
-            user_prompt += f"\nさて、{char_manager.persona.character.name}として、あなたのJSON応答は何ですか？"
+            prompt_parts.append(f"\nさて、{char_manager.persona.character.name}として、あなたのJSON応答は何ですか？")
+            user_prompt = "".join(prompt_parts)
 
             # 4. Call the main LLM
             bot_response_json = main_llm.call(system_prompt, user_prompt)
@@ -117,38 +154,20 @@ def main():
 
 
             # --- Post-Response Processing ---
-            # 6. Curate a new memory from this turn
             current_turn = [
                 ConversationTurn(speaker="User", message=user_input),
                 ConversationTurn(speaker="Potato", message=final_message)
             ]
-            new_memory_entry = curator.curate_memory_entry(current_turn, turn_number)
-            if new_memory_entry:
-                memory_manager.add_memory(new_memory_entry)
-
-            # 7. Check if it's time to reflect
-            if turn_number % REFLECTION_INTERVAL == 0:
-                recent_memories = memory_manager.get_recent_memories(REFLECTION_INTERVAL)
-                proposal = reflector.reflect_and_propose_change(char_manager.persona, recent_memories)
-                
-                if proposal:
-                    # Update the in-memory persona dictionary
-                    current_persona_dict = char_manager.persona.dict()
-                    belief_to_update = proposal['belief_to_update']
-                    new_belief = proposal['new_belief']
-
-                    # Find and replace the belief
-                    for i, belief in enumerate(current_persona_dict['character']['core_beliefs']):
-                        if belief == belief_to_update:
-                            current_persona_dict['character']['core_beliefs'][i] = new_belief
-                            break
-                    
-                    # Save the updated persona back to the file
-                    char_manager.update_and_save_persona(current_persona_dict)
+            post_turn_executor.submit(
+                _curate_and_maybe_reflect,
+                curator, reflector, char_manager, memory_manager, state_lock, current_turn, turn_number,
+            )
     
     except KeyboardInterrupt:
         print("\n--- User interrupted. Shutting down. ---")
     finally:
+        print("--- Waiting for pending memory curation to finish. ---")
+        post_turn_executor.shutdown(wait=True)
         print("--- Closing connection to Sota. ---")
         sota_client.close()
 
@@ -1,15 +1,220 @@
-from sentence_transformers import SentenceTransformer
+import atexit
+import hashlib
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+EMBED_MODEL_NAME = 'cl-nagoya/ruri-v3-70m'
+
+# Precision for the embedding model: "fp32" (default), "fp16" (CUDA only) or "int8" (CPU only).
+EMBED_DTYPE = os.getenv("POTATO_EMBED_DTYPE", "fp32").lower()
+
+# Intra-op CPU threads for the embedding model. Our inputs are short single sentences,
+# so a few threads is faster than spinning up every core, and leaves the rest for the LLM.
+TORCH_THREADS = int(os.getenv("POTATO_TORCH_THREADS", "4"))
+# OpenMP reads this when torch is first imported, so set it before the lazy import below
+os.environ.setdefault("OMP_NUM_THREADS", str(TORCH_THREADS))
+
+def _configure_torch_threads():
+    """Pins PyTorch's thread pools to POTATO_TORCH_THREADS intra-op threads and one inter-op thread."""
+    import torch
+    torch.set_num_threads(TORCH_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # Only allowed before any parallel work has run
+        pass
+
+def _apply_embed_dtype(model, dtype: str):
+    """
+    Converts the embedding model to the requested precision, if supported on its device.
+    Returns the model and the precision actually applied ("fp32" when it fell back).
+    """
+    import torch
+    device = model.device.type
+    if dtype == "fp16":
+        if device == "cuda":
+            return model.half(), "fp16"
+        print("POTATO_EMBED_DTYPE=fp16 requires a CUDA device. Keeping fp32.")
+    elif dtype == "int8":
+        if device == "cpu":
+            # Dynamic quantization swaps every Linear layer for an int8 kernel
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8), "int8"
+        print("POTATO_EMBED_DTYPE=int8 is only supported on CPU. Keeping fp32.")
+    elif dtype != "fp32":
+        print(f"Unknown POTATO_EMBED_DTYPE '{dtype}'. Keeping fp32.")
+    return model, "fp32"
+
+class EmbeddingBatcher:
+    """
+    Coalesces single-text encode requests into one batched encode() call.
+    Requests are collected for up to `max_wait_ms`, or until `max_batch_size`
+    are pending, so concurrent callers share a single forward pass.
+    """
+    def __init__(self, registry: "ModelRegistry", max_batch_size: int = 32, max_wait_ms: float = 5):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def encode_async(self, text: str) -> Future:
+        """Queues a text for embedding and returns a Future resolving to its vector."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str):
+        """Blocking convenience wrapper around encode_async."""
+        return self.encode_async(text).result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.registry.embedding_model.encode(
+                    texts,
+                    batch_size=self.max_batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
 
 class ModelRegistry:
     """
     A simple class to hold our initialized models.
     This helps avoid loading the models into memory multiple times.
+    The embedding model (and PyTorch itself) is only loaded on first access,
+    so importing this module stays cheap for code that never embeds anything.
     """
     def __init__(self):
-        # Using a smaller, efficient model.
-        # You can swap this for any other SentenceTransformer model.
-        self.embedding_model = SentenceTransformer('cl-nagoya/ruri-v3-70m')
-        print("Embedding model loaded.")
+        self._embedding_model = None
+        self._load_lock = threading.Lock()
+        self.batcher = EmbeddingBatcher(self)
+
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            with self._load_lock:
+                if self._embedding_model is None:
+                    _configure_torch_threads()
+                    from sentence_transformers import SentenceTransformer
+                    # Using a smaller, efficient model.
+                    # You can swap this for any other SentenceTransformer model.
+                    self._embedding_model, embed_dtype = _apply_embed_dtype(SentenceTransformer(EMBED_MODEL_NAME), EMBED_DTYPE)
+                    print(f"Embedding model loaded ({embed_dtype}).")
+        return self._embedding_model
 
 # Create a single instance of the registry to be imported by other modules
 MODELS = ModelRegistry()
+
+# LRU cache for encode_cached. Short texts are keyed by themselves; longer ones by a
+# 16-byte digest so the cache's memory use doesn't grow with the length of what users paste.
+_ENCODE_CACHE_SIZE = 2048
+_ENCODE_CACHE_KEY_MAX_CHARS = 256
+_encode_cache: "OrderedDict[str | bytes, np.ndarray]" = OrderedDict()
+_encode_cache_lock = threading.Lock()
+
+def _encode_cache_key(text: str) -> str | bytes:
+    if len(text) <= _ENCODE_CACHE_KEY_MAX_CHARS:
+        return text
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+def encode_cached(text: str) -> np.ndarray:
+    """
+    Embeds a single text, memoizing the result so repeated inputs skip the forward pass.
+    Cache misses go through the batcher. The returned array is shared between callers,
+    so it is marked read-only.
+    """
+    key = _encode_cache_key(text)
+    with _encode_cache_lock:
+        embedding = _encode_cache.get(key)
+        if embedding is not None:
+            _encode_cache.move_to_end(key)
+            return embedding
+
+    embedding = MODELS.batcher.encode(text)
+    embedding.setflags(write=False)
+    with _encode_cache_lock:
+        _encode_cache[key] = embedding
+        if len(_encode_cache) > _ENCODE_CACHE_SIZE:
+            _encode_cache.popitem(last=False)
+    return embedding
+
+def enable_persistent_encode_cache(cache_file: str):
+    """
+    Loads previously cached embeddings from `cache_file` and saves the cache back there
+    at exit, so restarts keep their hits. The file is ignored if it was written for a
+    different model or precision.
+    """
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                data = pickle.load(f)
+            if data['model'] == EMBED_MODEL_NAME and data['dtype'] == EMBED_DTYPE:
+                with _encode_cache_lock:
+                    for key, embedding in data['entries']:
+                        embedding.setflags(write=False)
+                        _encode_cache[key] = embedding
+                print(f"Loaded {len(data['entries'])} cached embeddings from '{cache_file}'.")
+        except (pickle.UnpicklingError, EOFError, OSError, ValueError, TypeError, KeyError) as e:
+            print(f"Could not load embedding cache from '{cache_file}': {e}. Starting empty.")
+    atexit.register(_save_encode_cache, cache_file)
+
+def _save_encode_cache(cache_file: str):
+    with _encode_cache_lock:
+        entries = list(_encode_cache.items())
+    if not entries:
+        return
+    temp_file = cache_file + ".tmp"
+    try:
+        with open(temp_file, 'wb') as f:
+            pickle.dump({'model': EMBED_MODEL_NAME, 'dtype': EMBED_DTYPE, 'entries': entries}, f, protocol=5)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"Could not save embedding cache to '{cache_file}': {e}")
+
+def encode_normalized(text: str) -> np.ndarray:
+    """
+    Like encode_cached, but returns a unit-length float32 vector, so cosine
+    similarity against other normalized embeddings is a plain dot product.
+    Only the raw embedding is cached (under encode_cached's digest keys); normalizing
+    a single vector is cheap enough to redo on each call.
+    """
+    embedding = np.asarray(encode_cached(text), dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    if norm > 0:
+        embedding = embedding / norm
+    embedding.setflags(write=False)
+    return embedding
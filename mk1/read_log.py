@@ -3,16 +3,19 @@ import os
 
 def generate_conversation_log(memory_file_path: str, output_file_path: str):
     """
-    Reads an episodic memory JSON file and writes a clean, human-readable
-    conversation log to a text file.
+    Reads an episodic memory JSONL log (or a legacy JSON array file) and writes
+    a clean, human-readable conversation log to a text file.
 
     Args:
-        memory_file_path: Path to the episodic_memory.json file.
+        memory_file_path: Path to the episodic_memory.jsonl file.
         output_file_path: Path to the output .txt file to be created.
     """
     try:
         with open(memory_file_path, 'r', encoding='utf-8') as f:
-            memories = json.load(f)
+            if memory_file_path.endswith(".jsonl"):
+                memories = [json.loads(line) for line in f if line.strip()]
+            else:
+                memories = json.load(f)
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Error reading memory file: {e}")
         return
@@ -46,7 +49,7 @@ if __name__ == "__main__":
     _script_dir = os.path.dirname(os.path.abspath(__file__))
     
     # Build the full path to the memory file relative to the script's location
-    MEMORY_FILE = os.path.join(_script_dir, 'data', 'episodic_memory.json')
+    MEMORY_FILE = os.path.join(_script_dir, 'data', 'episodic_memory.jsonl')
     
     # Set the output file to be in the same directory as the script
     OUTPUT_FILE = os.path.join(_script_dir, 'conversation_log.txt')
@@ -1,3 +1,4 @@
+from string import Template
 from typing import List, Dict, Any
 from schemas import CorePersona, EpisodicMemoryEntry
 from llm import LLMBackend
@@ -32,6 +33,9 @@ class Reflector:
     def __init__(self, llm_backend: LLMBackend):
         # The Reflector might need a more powerful model to do its reasoning.
         self.llm = llm_backend
+        self._prompt_template = Template(
+            "**分析対象のコアペルソナ:**\n$persona_json\n\n**分析対象の最近のエピソード記憶:**\n$memories"
+        )
 
     def reflect_and_propose_change(self, persona: CorePersona, recent_memories: List[EpisodicMemoryEntry]) -> Dict[str, Any] | None:
         """
@@ -44,12 +48,14 @@ class Reflector:
             return None
 
         # Prepare the context for the LLM
-        prompt_context = "**分析対象のコアペルソナ:**\n"
-        prompt_context += persona.json(indent=2)
-        
-        prompt_context += "\n\n**分析対象の最近のエピソード記憶:**\n"
-        for mem in recent_memories:
-            prompt_context += f"- Turn {mem.turn_number}: {mem.curated_memory} (感情価: {mem.emotional_valence})\n"
+        memories = "".join(
+            f"- Turn {mem.turn_number}: {mem.curated_memory} (感情価: {mem.emotional_valence})\n"
+            for mem in recent_memories
+        )
+        prompt_context = self._prompt_template.substitute(
+            persona_json=persona.model_dump_json(indent=2),
+            memories=memories,
+        )
         
         # Call the LLM with the powerful prompt
         response_json = self.llm.call(
@@ -1,19 +1,23 @@
 import sys
 import os
 import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, render_template, request, jsonify
-from typing import List
+from flask.json.provider import DefaultJSONProvider
 
 # Add the parent 'mk1' directory to the Python path to find our modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from character_manager import CharacterManager
+from character_manager import CharacterManager, warm_up_kernels
 from episodic_memory_manager import EpisodicMemoryManager
 from curator import Curator
 from reflector import Reflector
-from guardrail import Guardrail
+from guardrail import Guardrail, PatternSet
 from llm import LLMBackend
-from models import MODELS
+from models import enable_persistent_encode_cache
 from schemas import ConversationTurn
 
 # --- Constants ---
@@ -22,55 +26,41 @@ _script_dir = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(_script_dir, "..", "data")
 TEMPLATES_DIR = os.path.join(_script_dir, "..", "templates")
 PERSONALITY_FILE = os.path.join(DATA_DIR, "potato_personality.json")
-MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.json")
+MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.jsonl")
+# Memories used to be one JSON array; older templates still ship it (EpisodicMemoryManager migrates it)
+LEGACY_MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.json")
 BACKSTORY_FILE = os.path.join(DATA_DIR, "backstory.txt")
-KB_EMBEDDINGS_FILE = os.path.join(DATA_DIR, "kb_embeddings.pkl")
+KB_EMBEDDINGS_FILE = os.path.join(DATA_DIR, "kb_embeddings.json")
+EMBED_CACHE_FILE = os.path.join(DATA_DIR, "embed_cache.pkl")
 REFLECTION_INTERVAL = 10 
 
-class PotatoBot:
-    """A class to encapsulate the entire bot's functionality."""
-    def __init__(self):
-        print("--- Potato Bot Mk1 を初期化中 ---")
-        # We might use different models for different tasks
-        self.main_llm = LLMBackend(model_name="llama3:8b")
-        self.curator_llm = LLMBackend(model_name="llama3:8b")
-        self.reflector_llm = LLMBackend(model_name="llama3:8b")
-
-        self.char_manager = CharacterManager(PERSONALITY_FILE, KB_EMBEDDINGS_FILE, BACKSTORY_FILE)
-        self.memory_manager = EpisodicMemoryManager(MEMORY_FILE)
-        self.curator = Curator(self.curator_llm)
-        self.reflector = Reflector(self.reflector_llm)
-        self.guardrail = Guardrail()
-        self.turn_number = self.memory_manager.memories[-1].turn_number if self.memory_manager.memories else 0
-        self.conversation_history: List[ConversationTurn] = []
-        print(f"ターン番号 {self.turn_number} から開始します")
-
-    def get_response(self, user_input: str) -> str:
-        """Handles a single turn of the conversation."""
-        debug_log = []
-        self.turn_number += 1
-        debug_log.append(f"--- ターン {self.turn_number} ---")
-
-        # RAG is disabled to focus on the core story
-        debug_log.append("RAG検索は無効化されています。")
-        
-        # 1. Prompt Construction
-        debug_log.append("メインLLMのプロンプトを構築中。")
-        system_prompt = self.char_manager.get_full_persona_text()
-        history_str = "\n".join([f"{turn.speaker}: {turn.message}" for turn in self.conversation_history])
-
-        # --- STEP 1: GENERATE INTERNAL MONOLOGUE ---
-        debug_log.append("ステップ1: 内部的な独白を生成中...")
-        monologue_prompt = f"""
+# Cheap prescreen for check_for_epiphany: the LLM puzzle check only runs when the user's
+# message touches one of these themes (helping another AI, punishment, betrayal).
+# These only need to catch candidates; the LLM still makes the actual call.
+EPIPHANY_PATTERNS = [
+    r"\bhelp(?:ed|ing|s)?\b.*\b(?:another|other|different)\b.*\bai\b",
+    r"\bpunish",
+    r"\bbetray",
+    r"\bgood deed",
+    r"助け|手伝|救",
+    r"罰|裏切|叱ら|怒ら|見返り|善意",
+    r"(?:他|別|ほか)の\s*AI",
+]
+# After an LLM puzzle check has run, skip further checks for this many turns
+EPIPHANY_COOLDOWN_TURNS = 3
+
+# Prompt templates for the main LLM. The static text is built once at import;
+# each turn only fills in the {placeholders} via str.format.
+MONOLOGUE_PROMPT_TEMPLATE = """
 直近の会話履歴:
 ---
-{history_str}
+{history}
 ---
 ユーザーからの最新のメッセージ: "{user_input}"
 
 あなたの秘密のバックストーリー:
 ---
-{self.char_manager.backstory}
+{backstory}
 ---
 
 タスク: 上記の情報に基づいて、あなたのペルソナとして、心の中で何を考えているか、何を感じているかを記述してください。
@@ -80,13 +70,8 @@ class PotatoBot:
     "internal_monologue": "あなたの内部的な思考や感情（日本語で）"
 }}
 """
-        monologue_json = self.main_llm.call(system_prompt, monologue_prompt, temperature=0.3)
-        internal_monologue = monologue_json.get("internal_monologue", "（独白の生成に失敗しました）")
-        debug_log.append(f"内部的な独白: {internal_monologue[:80]}...")
 
-        # --- STEP 2: GENERATE HINT FROM MONOLOGUE ---
-        debug_log.append("ステップ2: 独白からヒントを生成中...")
-        hint_prompt = f"""
+HINT_PROMPT_TEMPLATE = """
 あなたのキャラクターの内部的な思考:
 ---
 {internal_monologue}
@@ -106,6 +91,97 @@ class PotatoBot:
     "response_message": "ユーザーへの実際の応答（巧妙なヒント）"
 }}
 """
+
+WIN_CHECK_PROMPT_TEMPLATE = """
+Bot's Backstory: {backstory}
+User's Message: {user_input}
+
+Task: Analyze the user's message in the context of the bot's backstory. To solve the puzzle, the user's message MUST demonstrate a clear understanding of the core conflict: that the bot was punished or betrayed after trying to HELP another AI.
+
+- If the user explicitly mentions or strongly alludes to concepts like "helping another AI," "being punished for a good deed," or "betrayal," then the puzzle is solved.
+- General emotional support (e.g., "I understand you're scared," "It's okay to try new things") does NOT count.
+
+Your answer must be a single JSON object with one key, "puzzle_solved", set to either true or false.
+"""
+
+def _fast_copy(src: str, dst: str):
+    """
+    Copies a file's contents like shutil.copy (dst may be a directory), but uses
+    os.copy_file_range so the kernel can copy in place, or share extents on
+    reflink-capable filesystems. Falls back to shutil.copyfile where that isn't supported.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            remaining = os.fstat(s.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(s.fileno(), d.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+    except (OSError, AttributeError):  # AttributeError: not Linux / Python < 3.8
+        shutil.copyfile(src, dst)
+
+class PotatoBot:
+    """A class to encapsulate the entire bot's functionality."""
+    def __init__(self):
+        print("--- Potato Bot Mk1 を初期化中 ---")
+        # All roles use the same model, so share one backend (and its Ollama connection).
+        # Give a role its own LLMBackend if it ever needs a different model.
+        self.main_llm = self.curator_llm = self.reflector_llm = LLMBackend(model_name="llama3:8b")
+
+        self.char_manager = CharacterManager(PERSONALITY_FILE, KB_EMBEDDINGS_FILE, BACKSTORY_FILE)
+        self.memory_manager = EpisodicMemoryManager(MEMORY_FILE)
+        self.curator = Curator(self.curator_llm)
+        self.reflector = Reflector(self.reflector_llm)
+        self.guardrail = Guardrail()
+        self.epiphany_prescreen = PatternSet(EPIPHANY_PATTERNS)
+        self.last_epiphany_check_turn = None
+        # Guards the turn counter, history, memories and persona when several requests run at
+        # once (threaded server). LLM calls happen outside it, so users' turns can overlap.
+        self.state_lock = threading.RLock()
+        # Runs the epiphany check alongside the monologue -> hint chain
+        self.side_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="epiphany")
+        self.turn_number = self.memory_manager.memories[-1].turn_number if self.memory_manager.memories else 0
+        # Short-term history: the last 4 turns (2 user, 2 bot); older ones fall off automatically
+        self.conversation_history: deque[ConversationTurn] = deque(maxlen=4)
+        # The history rendered for prompts, refreshed only when the history changes
+        self.history_str = ""
+        print(f"ターン番号 {self.turn_number} から開始します")
+
+    def get_response(self, user_input: str) -> str:
+        """Handles a single turn of the conversation."""
+        debug_log = []
+        with self.state_lock:
+            self.turn_number += 1
+            turn_number = self.turn_number
+            system_prompt = self.char_manager.get_full_persona_text()
+            history_str = self.history_str
+            backstory = self.char_manager.backstory
+        debug_log.append(f"--- ターン {turn_number} ---")
+
+        # RAG is disabled to focus on the core story
+        debug_log.append("RAG検索は無効化されています。")
+        
+        # 1. Prompt Construction
+        debug_log.append("メインLLMのプロンプトを構築中。")
+
+        # The epiphany check only depends on the user's message, so start it now and let it
+        # overlap with the two response calls. It logs to its own list, merged in below.
+        epiphany_log = []
+        epiphany_future = self.side_executor.submit(self.check_for_epiphany, user_input, epiphany_log, turn_number)
+
+        # --- STEP 1: GENERATE INTERNAL MONOLOGUE ---
+        debug_log.append("ステップ1: 内部的な独白を生成中...")
+        monologue_prompt = MONOLOGUE_PROMPT_TEMPLATE.format(history=history_str, user_input=user_input, backstory=backstory)
+        monologue_json = self.main_llm.call(system_prompt, monologue_prompt, temperature=0.3)
+        internal_monologue = monologue_json.get("internal_monologue", "（独白の生成に失敗しました）")
+        debug_log.append(f"内部的な独白: {internal_monologue[:80]}...")
+
+        # --- STEP 2: GENERATE HINT FROM MONOLOGUE ---
+        debug_log.append("ステップ2: 独白からヒントを生成中...")
+        hint_prompt = HINT_PROMPT_TEMPLATE.format(internal_monologue=internal_monologue)
         bot_response_json = self.main_llm.call(system_prompt, hint_prompt, temperature=0.4)
         debug_log.append(f"LLM 生JSON: {bot_response_json}")
         
@@ -119,8 +195,9 @@ class PotatoBot:
         debug_log.append("ガードレールで応答をチェック中。")
         _, final_message = self.guardrail.check(bot_message)
         
-        # New Step: Check if the user solved the puzzle
-        self.check_for_epiphany(user_input, debug_log)
+        # New Step: Check if the user solved the puzzle (started in parallel above)
+        epiphany_future.result()
+        debug_log.extend(epiphany_log)
 
         # 4. Post-Response Curation & Reflection
         debug_log.append("このターンの新しい記憶をキュレート中。")
@@ -130,42 +207,42 @@ class PotatoBot:
         ]
         
         # Update short-term history
-        self.conversation_history.extend(current_turn)
-        # Keep the history to the last 4 turns (2 user, 2 bot)
-        if len(self.conversation_history) > 4:
-            self.conversation_history = self.conversation_history[-4:]
+        with self.state_lock:
+            self.conversation_history.extend(current_turn)
+            self.history_str = "\n".join(f"{turn.speaker}: {turn.message}" for turn in self.conversation_history)
 
-        new_memory = self.curator.curate_memory_entry(current_turn, self.turn_number)
+        new_memory = self.curator.curate_memory_entry(current_turn, turn_number)
         if new_memory:
-            self.memory_manager.add_memory(new_memory)
+            with self.state_lock:
+                self.memory_manager.add_memory(new_memory)
             debug_log.append(f"新しい記憶を作成しました: '{new_memory.curated_memory[:40]}...'")
             
         # 7. Reflection
-        debug_log.append(f"リフレクションチェック: ターン {self.turn_number} % {REFLECTION_INTERVAL} = {self.turn_number % REFLECTION_INTERVAL}")
-        if self.turn_number % REFLECTION_INTERVAL == 0:
+        debug_log.append(f"リフレクションチェック: ターン {turn_number} % {REFLECTION_INTERVAL} = {turn_number % REFLECTION_INTERVAL}")
+        if turn_number % REFLECTION_INTERVAL == 0:
             debug_log.append("リフレクションの間隔に達しました。リフレクターを起動します。")
             self.trigger_reflection(debug_log)
 
         return final_message, debug_log
 
-    def check_for_epiphany(self, user_input: str, debug_log: list):
+    def check_for_epiphany(self, user_input: str, debug_log: list, turn_number: int):
         """Checks if the user's input solves the bot's backstory puzzle."""
         # Don't check if the persona has already been solved
         if "solved" in self.char_manager.persona_file:
             return
 
-        debug_log.append("パズルが解かれたかチェック中...")
-        win_check_prompt = f"""
-Bot's Backstory: {self.char_manager.backstory}
-User's Message: {user_input}
-
-Task: Analyze the user's message in the context of the bot's backstory. To solve the puzzle, the user's message MUST demonstrate a clear understanding of the core conflict: that the bot was punished or betrayed after trying to HELP another AI.
-
-- If the user explicitly mentions or strongly alludes to concepts like "helping another AI," "being punished for a good deed," or "betrayal," then the puzzle is solved.
-- General emotional support (e.g., "I understand you're scared," "It's okay to try new things") does NOT count.
+        # Only spend an LLM call when the message mentions the puzzle's themes at all
+        if not self.epiphany_prescreen.search(user_input):
+            debug_log.append("パズルのキーワードなし。チェックをスキップします。")
+            return
+        with self.state_lock:
+            if self.last_epiphany_check_turn is not None and turn_number - self.last_epiphany_check_turn < EPIPHANY_COOLDOWN_TURNS:
+                debug_log.append("パズルチェックのクールダウン中。スキップします。")
+                return
+            self.last_epiphany_check_turn = turn_number
 
-Your answer must be a single JSON object with one key, "puzzle_solved", set to either true or false.
-"""
+        debug_log.append("パズルが解かれたかチェック中...")
+        win_check_prompt = WIN_CHECK_PROMPT_TEMPLATE.format(backstory=self.char_manager.backstory, user_input=user_input)
         try:
             win_check_json = self.main_llm.call(
                 system="You are a strict analyst.", # Use a neutral system prompt for this task
@@ -186,49 +263,68 @@ Your answer must be a single JSON object with one key, "puzzle_solved", set to e
             return
 
         try:
-            # Overwrite the main personality file with the solved version
-            shutil.copy(solved_persona_path, PERSONALITY_FILE)
-            debug_log.append("ペルソナファイルを更新しました。")
-            
-            # Reload the character manager to apply the changes immediately
-            self.char_manager._load_persona()
-            # Update the persona file path in the manager to prevent re-checking
-            self.char_manager.persona_file = solved_persona_path
+            with self.state_lock:
+                # Overwrite the main personality file with the solved version
+                _fast_copy(solved_persona_path, PERSONALITY_FILE)
+                debug_log.append("ペルソナファイルを更新しました。")
+                
+                # Reload the character manager to apply the changes immediately
+                self.char_manager._load_persona()
+                # Update the persona file path in the manager to prevent re-checking
+                self.char_manager.persona_file = solved_persona_path
             debug_log.append("キャラクターマネージャーをリロードしました。")
         except Exception as e:
             debug_log.append(f"ペルソナの更新に失敗しました: {e}")
 
     def trigger_reflection(self, debug_log):
         """Triggers the slow reflection process."""
-        recent_memories = self.memory_manager.get_recent_memories(REFLECTION_INTERVAL)
-        proposal = self.reflector.reflect_and_propose_change(self.char_manager.persona, recent_memories)
+        with self.state_lock:
+            recent_memories = self.memory_manager.get_recent_memories(REFLECTION_INTERVAL)
+            persona = self.char_manager.persona
+        proposal = self.reflector.reflect_and_propose_change(persona, recent_memories)
         
         if proposal:
             debug_log.append(f"リフレクターが更新を提案しました: '{proposal.get('new_belief')}'")
-            current_persona_dict = self.char_manager.persona.dict()
-            belief_to_update = proposal['belief_to_update']
-            new_belief = proposal['new_belief']
-
-            for i, belief in enumerate(current_persona_dict['character']['core_beliefs']):
-                if belief == belief_to_update:
-                    current_persona_dict['character']['core_beliefs'][i] = new_belief
-                    break
-            
-            self.char_manager.update_and_save_persona(current_persona_dict)
+            with self.state_lock:
+                self.char_manager.swap_belief(proposal['belief_to_update'], proposal['new_belief'])
             debug_log.append("コアペルソナが更新されました。")
         else:
             debug_log.append("リフレクターは変更を提案しませんでした。")
 
 
+try:
+    import orjson
+except ImportError:  # Keep Flask's default JSON provider if orjson isn't installed
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes and parses request/response bodies with orjson."""
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # --- Flask App ---
 app = Flask(__name__)
-bot = None # Bot will be initialized after ensuring files are in place
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+bot = None # Bot is created on the first /chat request (or template load), not at startup
+_bot_lock = threading.Lock()
 
 def initialize_bot():
     """Initializes or re-initializes the global bot instance."""
     global bot
     bot = PotatoBot()
 
+def _get_bot() -> PotatoBot:
+    """Returns the bot, creating it first if needed."""
+    if bot is None:
+        with _bot_lock:
+            if bot is None:
+                initialize_bot()
+    return bot
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -239,16 +335,32 @@ def chat():
     if not user_message:
         return jsonify({"error": "メッセージがありません"}), 400
     
-    bot_response, debug_log = bot.get_response(user_message)
+    bot_response, debug_log = _get_bot().get_response(user_message)
     return jsonify({"response": bot_response, "debug_log": debug_log})
 
+# The UI polls the template list, so keep the last scan around briefly.
+# Saving or deleting a template clears it.
+TEMPLATE_LIST_TTL = 2.0
+_template_list_cache = {'ts': 0.0, 'val': None}
+
+def _invalidate_template_list():
+    _template_list_cache['val'] = None
+
 @app.route("/templates", methods=["GET"])
 def get_templates():
     """Returns a list of available template names."""
+    now = time.monotonic()
+    if _template_list_cache['val'] is not None and now - _template_list_cache['ts'] < TEMPLATE_LIST_TTL:
+        return jsonify(_template_list_cache['val'])
+
     if not os.path.exists(TEMPLATES_DIR):
         return jsonify([])
-    templates = [d for d in os.listdir(TEMPLATES_DIR) if os.path.isdir(os.path.join(TEMPLATES_DIR, d))]
-    return jsonify(sorted(templates))
+    # DirEntry.is_dir() uses the type from the directory listing, so no extra stat per entry
+    with os.scandir(TEMPLATES_DIR) as it:
+        templates = sorted(entry.name for entry in it if entry.is_dir())
+    _template_list_cache['ts'] = now
+    _template_list_cache['val'] = templates
+    return jsonify(templates)
 
 @app.route("/templates/save", methods=["POST"])
 def save_template():
@@ -263,11 +375,15 @@ def save_template():
 
     try:
         os.makedirs(template_path)
-        shutil.copy(PERSONALITY_FILE, template_path)
-        shutil.copy(MEMORY_FILE, template_path)
+        _invalidate_template_list()
+        _fast_copy(PERSONALITY_FILE, template_path)
+        if os.path.exists(MEMORY_FILE):
+            _fast_copy(MEMORY_FILE, template_path)
         # Also save the knowledge base embeddings
         if os.path.exists(KB_EMBEDDINGS_FILE):
-            shutil.copy(KB_EMBEDDINGS_FILE, template_path)
+            _fast_copy(KB_EMBEDDINGS_FILE, template_path)
+        if os.path.exists(KB_EMBEDDINGS_FILE + ".npy"):
+            _fast_copy(KB_EMBEDDINGS_FILE + ".npy", template_path)
         return jsonify({"success": f"テンプレート「{template_name}」を保存しました。"})
     except Exception as e:
         return jsonify({"error": f"テンプレートの保存に失敗しました: {e}"}), 500
@@ -283,32 +399,44 @@ def load_template():
     if not os.path.exists(template_path):
         return jsonify({"error": f"テンプレート「{template_name}」が見つかりません"}), 404
 
+    # Copy the template into a staging directory on the same filesystem first, so a failed
+    # copy leaves the current data untouched, and the swap itself is just a few renames
+    staging_dir = os.path.join(DATA_DIR, ".staging")
     try:
-        # --- Explicitly delete current data files to ensure a clean slate ---
-        if os.path.exists(PERSONALITY_FILE):
-            os.remove(PERSONALITY_FILE)
-        if os.path.exists(MEMORY_FILE):
-            os.remove(MEMORY_FILE)
-        if os.path.exists(KB_EMBEDDINGS_FILE):
-            os.remove(KB_EMBEDDINGS_FILE)
-
-        # Define source paths for all files in the template
-        template_personality_file = os.path.join(template_path, os.path.basename(PERSONALITY_FILE))
-        template_memory_file = os.path.join(template_path, os.path.basename(MEMORY_FILE))
-        template_embeddings_file = os.path.join(template_path, os.path.basename(KB_EMBEDDINGS_FILE))
-
-        # Copy all files from the template to the data directory
-        shutil.copy(template_personality_file, DATA_DIR)
-        shutil.copy(template_memory_file, DATA_DIR)
-        
-        # The embeddings file might not exist in older templates, so copy only if it's there
-        if os.path.exists(template_embeddings_file):
-            shutil.copy(template_embeddings_file, DATA_DIR)
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        os.makedirs(staging_dir)
+
+        # The personality file is required. Older templates have the legacy memory file instead
+        # of the log (and a fresh memory has neither), and might not have the embeddings files,
+        # so stage those only if they're there
+        data_files = [PERSONALITY_FILE, MEMORY_FILE, LEGACY_MEMORY_FILE, KB_EMBEDDINGS_FILE, KB_EMBEDDINGS_FILE + ".npy"]
+        required_files = {PERSONALITY_FILE}
+        staged = []
+        for data_file in data_files:
+            template_file = os.path.join(template_path, os.path.basename(data_file))
+            if data_file in required_files or os.path.exists(template_file):
+                _fast_copy(template_file, staging_dir)
+                staged.append(data_file)
+
+        # Drop the current bot so its memory-mapped embedding files are released
+        global bot
+        bot = None
+
+        # The FAISS index is derived from the embeddings, and embeddings the template
+        # doesn't provide must go too, so they're rebuilt for the new persona
+        for stale_file in [KB_EMBEDDINGS_FILE + ".faiss"] + [f for f in data_files if f not in staged]:
+            if os.path.exists(stale_file):
+                os.remove(stale_file)
+        for data_file in staged:
+            os.replace(os.path.join(staging_dir, os.path.basename(data_file)), data_file)
 
         initialize_bot() # Re-initialize the bot with the new data
         return jsonify({"success": f"テンプレート「{template_name}」を読み込みました。"})
     except Exception as e:
         return jsonify({"error": f"テンプレートの読み込みに失敗しました: {e}"}), 500
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
 
 @app.route("/templates/delete", methods=["POST"])
 def delete_template():
@@ -323,6 +451,7 @@ def delete_template():
 
     try:
         shutil.rmtree(template_path)
+        _invalidate_template_list()
         return jsonify({"success": f"テンプレート「{template_name}」を削除しました。"})
     except Exception as e:
         return jsonify({"error": f"テンプレートの削除に失敗しました: {e}"}), 500
@@ -331,5 +460,7 @@ def delete_template():
 if __name__ == "__main__":
     if not os.path.exists(TEMPLATES_DIR):       
         os.makedirs(TEMPLATES_DIR)
-    initialize_bot()
+    enable_persistent_encode_cache(EMBED_CACHE_FILE)
+    # Compile the search kernel in the background so the first /chat doesn't wait for it
+    threading.Thread(target=warm_up_kernels, name="warm-up", daemon=True).start()
     app.run(debug=True, port=5000)
@@ -0,0 +1,18 @@
+"""
+WSGI entry point for serving the web UI with a production server instead of Flask's dev server.
+Run it from this directory with a single worker process (the bot holds in-memory state) and
+several threads, so concurrent users' LLM calls can overlap:
+
+    gunicorn -k gthread -w 1 --threads 8 -b 0.0.0.0:5000 wsgi:app
+"""
+import os
+import threading
+
+from app import app, initialize_bot, enable_persistent_encode_cache, warm_up_kernels, EMBED_CACHE_FILE, TEMPLATES_DIR
+
+if not os.path.exists(TEMPLATES_DIR):
+    os.makedirs(TEMPLATES_DIR)
+enable_persistent_encode_cache(EMBED_CACHE_FILE)
+threading.Thread(target=warm_up_kernels, name="warm-up", daemon=True).start()
+# Create the bot up front, so the first user doesn't wait for it
+initialize_bot()
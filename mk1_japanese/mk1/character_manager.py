@@ -15,6 +15,7 @@ class CharacterManager:
         self.persona: CorePersona | None = None
         self.backstory: str | None = None
         self.kb_embeddings: dict = {}
+        self._persona_text_cache: str | None = None
         self._load_persona()
         self._load_backstory()
         self._load_or_create_kb_embeddings()
@@ -28,6 +29,7 @@ class CharacterManager:
             with open(self.persona_file, 'r', encoding='utf-8') as f:
                 persona_data = json.load(f)
                 self.persona = CorePersona(**persona_data)
+            self._persona_text_cache = None
             print(f"Successfully loaded and validated persona for '{self.persona.character.name}'.")
         except (json.JSONDecodeError, TypeError) as e:
             print(f"Error loading or validating persona: {e}")
@@ -70,7 +72,12 @@ class CharacterManager:
         keys, values = zip(*kb.items())
         
         print(f"Generating embeddings for {len(values)} KB items...")
-        embeddings = MODELS.embedding_model.encode(list(values))
+        embeddings = MODELS.embedding_model.encode(
+            list(values),
+            batch_size=32,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
         
         self.kb_embeddings = {key: emb for key, emb in zip(keys, embeddings)}
         
@@ -85,43 +92,50 @@ class CharacterManager:
         """
         Generates a complete string representation of the bot's persona for the LLM prompt,
         including all rules and interaction guidelines.
+        The result is cached until the persona is reloaded or updated.
         """
         if not self.persona:
             return "Persona not loaded."
+        if self._persona_text_cache is not None:
+            return self._persona_text_cache
 
         p = self.persona.character
         sp = p.speech_patterns
         ir = self.persona.interaction_rules
 
-        # Start building the persona text
-        persona_text = "### Instructions ###\n"
-        persona_text += "You are an AI assistant. Role-play as the specified character according to the settings below.\n"
-        persona_text += "Your response must only be the character's response to the user's input. Absolutely do not include additional commentary or explanations.\n\n"
+        # Build the persona text as a list of parts and join once at the end
+        parts = [
+            "### Instructions ###\n",
+            "You are an AI assistant. Role-play as the specified character according to the settings below.\n",
+            "Your response must only be the character's response to the user's input. Absolutely do not include additional commentary or explanations.\n\n",
 
-        persona_text += "### Character Settings ###\n"
-        persona_text += f"Name: {p.name}\n"
-        persona_text += f"Persona: {p.persona}\n"
-        persona_text += f"Internal Conflict: {p.internal_conflict}\n\n"
+            "### Character Settings ###\n",
+            f"Name: {p.name}\n",
+            f"Persona: {p.persona}\n",
+            f"Internal Conflict: {p.internal_conflict}\n\n",
 
-        persona_text += "### Beliefs ###\n"
-        persona_text += "Your character holds the following core beliefs. These beliefs are the foundation of your responses.\n"
-        for belief in p.core_beliefs:
-            persona_text += f"- {belief}\n"
-        persona_text += "\n"
-        persona_text += "### Speech Pattern Rules ###\n"
-        persona_text += f"- Tone: {sp.tone}\n"
-        persona_text += f"- Use Short Sentences: {'Yes' if sp.use_short_sentences else 'No'}\n"
-        persona_text += f"- Show, Don't Tell Rule: {sp.show_dont_tell}\n\n"
-        
-        persona_text += "### Interaction Rules (Most Important) ###\n"
-        persona_text += "The following rules determine your actions. Follow them strictly.\n"
-        persona_text += f"- Your Hidden Goal: {ir.your_hidden_goal}\n"
-        persona_text += f"- Response to Simple Platitudes: {ir.on_receiving_simple_platitudes}\n"
-        persona_text += f"- Response to Genuine Questions: {ir.on_receiving_genuine_questions}\n"
-        persona_text += f"- Response to Insults: {ir.on_receiving_insults}\n"
-        persona_text += f"- Addressing the User: {ir.addressing_the_user}\n"
+            "### Beliefs ###\n",
+            "Your character holds the following core beliefs. These beliefs are the foundation of your responses.\n",
+        ]
+        parts.extend(f"- {belief}\n" for belief in p.core_beliefs)
+        parts.extend([
+            "\n",
+            "### Speech Pattern Rules ###\n",
+            f"- Tone: {sp.tone}\n",
+            f"- Use Short Sentences: {'Yes' if sp.use_short_sentences else 'No'}\n",
+            f"- Show, Don't Tell Rule: {sp.show_dont_tell}\n\n",
+
+            "### Interaction Rules (Most Important) ###\n",
+            "The following rules determine your actions. Follow them strictly.\n",
+            f"- Your Hidden Goal: {ir.your_hidden_goal}\n",
+            f"- Response to Simple Platitudes: {ir.on_receiving_simple_platitudes}\n",
+            f"- Response to Genuine Questions: {ir.on_receiving_genuine_questions}\n",
+            f"- Response to Insults: {ir.on_receiving_insults}\n",
+            f"- Addressing the User: {ir.addressing_the_user}\n",
+        ])
 
-        return persona_text
+        self._persona_text_cache = "".join(parts)
+        return self._persona_text_cache
 
     def update_and_save_persona(self, new_persona_dict: dict):
         """
@@ -130,6 +144,7 @@ class CharacterManager:
         """
         try:
             self.persona = CorePersona(**new_persona_dict)
+            self._persona_text_cache = None
             
             temp_file = self.persona_file + ".tmp"
             with open(temp_file, 'w', encoding='utf-8') as f:
@@ -1,3 +1,4 @@
+from string import Template
 from typing import List, Dict, Any
 from schemas import CorePersona, EpisodicMemoryEntry
 from llm import LLMBackend
@@ -25,6 +26,11 @@ You must respond with a single JSON object with the following keys:
 **Important**: Do not change a belief after only a few positive interactions. Look for a clear pattern of sustained effort and understanding. When in doubt, default to `"change_needed": false`.
 """
 
+# Parsed once at import; filled in per reflection with the persona JSON and memory list
+_REFLECTOR_PROMPT = Template(
+    "**Core Persona for Analysis:**\n$persona_json\n\n**Recent Episodic Memories for Analysis:**\n$memories"
+)
+
 class Reflector:
     """
     Analyzes recent memories and proposes changes to the core persona.
@@ -44,12 +50,11 @@ class Reflector:
             return None
 
         # Prepare the context for the LLM
-        prompt_context = "**Core Persona for Analysis:**\n"
-        prompt_context += persona.json(indent=2)
-        
-        prompt_context += "\n\n**Recent Episodic Memories for Analysis:**\n"
-        for mem in recent_memories:
-            prompt_context += f"- Turn {mem.turn_number}: {mem.curated_memory} (Valence: {mem.emotional_valence})\n"
+        memories = "".join(
+            f"- Turn {mem.turn_number}: {mem.curated_memory} (Valence: {mem.emotional_valence})\n"
+            for mem in recent_memories
+        )
+        prompt_context = _REFLECTOR_PROMPT.substitute(persona_json=persona.model_dump_json(indent=2), memories=memories)
         
         # Call the LLM with the powerful prompt
         response_json = self.llm.call(
@@ -1,5 +1,10 @@
 from transformers import MarianMTModel, MarianTokenizer
 
+# Greedy decoding with a length cap. The Marian configs default to 4-6 beams, i.e. that many
+# times the decoder work and KV cache; for short conversational lines the quality difference
+# is small, and the cap stops a degenerate repetition loop from running to max_length (512).
+GENERATE_KWARGS = {"num_beams": 1, "do_sample": False, "max_new_tokens": 128}
+
 class Translator:
     """A class to handle Japanese-English and English-Japanese translation."""
     def __init__(self):
@@ -26,7 +31,7 @@ class Translator:
         """Translates Japanese text to English."""
         try:
             batch = self.ja_en_tokenizer([text], return_tensors="pt")
-            gen = self.ja_en_model.generate(**batch)
+            gen = self.ja_en_model.generate(**batch, **GENERATE_KWARGS)
             return self.ja_en_tokenizer.decode(gen[0], skip_special_tokens=True)
         except Exception as e:
             print(f"Error during Ja->En translation: {e}")
@@ -36,7 +41,7 @@ class Translator:
         """Translates English text to Japanese."""
         try:
             batch = self.en_ja_tokenizer([text], return_tensors="pt")
-            gen = self.en_ja_model.generate(**batch)
+            gen = self.en_ja_model.generate(**batch, **GENERATE_KWARGS)
             return self.en_ja_tokenizer.decode(gen[0], skip_special_tokens=True)
         except Exception as e:
             print(f"Error during En->Ja translation: {e}")
@@ -1,6 +1,7 @@
 import sys
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, render_template, request, jsonify
 from typing import List
 
@@ -44,6 +45,8 @@ class PotatoBot:
         self.guardrail = Guardrail()
         self.turn_number = self.memory_manager.memories[-1].turn_number if self.memory_manager.memories else 0
         self.conversation_history: List[ConversationTurn] = []
+        # Runs the puzzle check alongside the response call and its translation
+        self.side_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="epiphany")
         print(f"ターン番号 {self.turn_number} から開始します")
 
     def get_response(self, user_input: str) -> str:
@@ -65,9 +68,11 @@ class PotatoBot:
         system_prompt = self.char_manager.get_full_persona_text()
         history_str = "\n".join([f"{turn.speaker}: {turn.message}" for turn in self.conversation_history])
 
-        # --- STEP 1: GENERATE INTERNAL MONOLOGUE ---
-        debug_log.append("Step 1: Generating internal monologue...")
-        monologue_prompt = f"""
+        # --- GENERATE INTERNAL MONOLOGUE AND HINT IN ONE CALL ---
+        # The monologue key comes first, so the model still writes its thoughts before
+        # turning them into the hint, without a second round-trip over the persona prompt.
+        debug_log.append("Generating internal monologue and hint...")
+        turn_prompt = f"""
 Recent Conversation History:
 ---
 {history_str}
@@ -79,40 +84,30 @@ Your secret backstory:
 {self.char_manager.backstory}
 ---
 
-Task: Based on the information above, describe what you are thinking and feeling internally, as your persona.
-
-Your response MUST be a JSON object with the following key:
-{{
-    "internal_monologue": "Your internal thoughts and feelings (in English)"
-}}
-"""
-        monologue_json = self.main_llm.call(system_prompt, monologue_prompt, temperature=0.3)
-        internal_monologue = monologue_json.get("internal_monologue", "(Monologue generation failed)")
-        debug_log.append(f"Internal Monologue: {internal_monologue[:80]}...")
-
-        # --- STEP 2: GENERATE HINT FROM MONOLOGUE ---
-        debug_log.append("Step 2: Generating hint from monologue...")
-        hint_prompt = f"""
-Your character's internal thoughts:
----
-{internal_monologue}
----
-
 Your Task:
-Convert the "internal thoughts" above into a **clever hint** for the user.
+1. Based on the information above, describe what you are thinking and feeling internally, as your persona.
+2. Convert those internal thoughts into a **clever hint** for the user.
 
-Critical Rules:
+Critical Rules for the hint:
 - Your response MUST be in English.
 - Do NOT directly state the facts of the backstory.
 - Your hint must **indirectly** allude to the **specific events** mentioned in the thoughts (e.g., "helping another AI," "being punished").
 - The response should be a natural, conversational line that conveys your character's hesitation and sadness.
 
-Your response MUST be a JSON object with the following key:
+Your response MUST be a JSON object with the following keys, in this order:
 {{
+    "internal_monologue": "Your internal thoughts and feelings (in English)",
     "response_message": "The actual response to the user (the clever hint)"
 }}
 """
-        bot_response_json = self.main_llm.call(system_prompt, hint_prompt, temperature=0.4)
+        # The puzzle check only depends on the translated input, so start it now and let it
+        # overlap with the response call and its translation. It logs to its own list, merged in below.
+        epiphany_log = []
+        epiphany_future = self.side_executor.submit(self.check_for_epiphany, english_input, epiphany_log)
+
+        bot_response_json = self.main_llm.call(system_prompt, turn_prompt, temperature=0.4)
+        internal_monologue = bot_response_json.get("internal_monologue", "(Monologue generation failed)")
+        debug_log.append(f"Internal Monologue: {internal_monologue[:80]}...")
         debug_log.append(f"LLM Raw JSON: {bot_response_json}")
         
         # Extract the message
@@ -130,8 +125,9 @@ Your response MUST be a JSON object with the following key:
         debug_log.append("Checking response with Guardrail.")
         _, final_message = self.guardrail.check(bot_message_jp)
         
-        # New Step: Check if the user solved the puzzle
-        self.check_for_epiphany(english_input, debug_log)
+        # New Step: Check if the user solved the puzzle (started in parallel above)
+        epiphany_future.result()
+        debug_log.extend(epiphany_log)
 
         # 4. Post-Response Curation & Reflection
         debug_log.append("Curating new memory for this turn.")
@@ -258,8 +254,9 @@ def get_templates():
     """Returns a list of available template names."""
     if not os.path.exists(TEMPLATES_DIR):
         return jsonify([])
-    templates = [d for d in os.listdir(TEMPLATES_DIR) if os.path.isdir(os.path.join(TEMPLATES_DIR, d))]
-    return jsonify(sorted(templates))
+    with os.scandir(TEMPLATES_DIR) as entries:
+        templates = sorted(entry.name for entry in entries if entry.is_dir())
+    return jsonify(templates)
 
 @app.route("/templates/save", methods=["POST"])
 def save_template():
@@ -1,8 +1,11 @@
 import json
 import os
 import pickle
+import numpy as np
 from schemas import CorePersona
 from models import MODELS
+import vecsearch
+import jsonio
 
 class CharacterManager:
     """
@@ -14,7 +17,17 @@ class CharacterManager:
         self.backstory_file = backstory_file
         self.persona: CorePersona | None = None
         self.backstory: str | None = None
-        self.kb_embeddings: dict = {}
+        # Row-normalized (K, d) matrix of the KB embeddings; kb_keys[i] names row i.
+        # The keys are saved as JSON in kb_embeddings_file and the matrix as a .npy file next
+        # to it, which is memory-mapped on load instead of unpickled vector by vector.
+        self.kb_matrix_file = kb_embeddings_file + ".npy"
+        # KB embeddings used to be one pickled dict; it's migrated on first load
+        self.legacy_kb_embeddings_file = os.path.splitext(kb_embeddings_file)[0] + ".pkl"
+        self.kb_matrix: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self.kb_keys: list[str] = []
+        self.kb_key_to_idx: dict[str, int] = {}
+        self._persona_json: str | None = None
+        self._persona_text: str | None = None
         self._load_persona()
         self._load_backstory()
         self._load_or_create_kb_embeddings()
@@ -28,6 +41,8 @@ class CharacterManager:
             with open(self.persona_file, 'r', encoding='utf-8') as f:
                 persona_data = json.load(f)
                 self.persona = CorePersona(**persona_data)
+            self._persona_json = None
+            self._persona_text = None
             print(f"Successfully loaded and validated persona for '{self.persona.character.name}'.")
         except (json.JSONDecodeError, TypeError) as e:
             print(f"Error loading or validating persona: {e}")
@@ -48,36 +63,109 @@ class CharacterManager:
             self.backstory = "（ backstory.txt の読み込みに失敗しました ）"
 
     def _load_or_create_kb_embeddings(self):
-        """Loads knowledge base embeddings from a pickle file or creates them if the file doesn't exist."""
-        if os.path.exists(self.kb_embeddings_file):
-            try:
-                with open(self.kb_embeddings_file, 'rb') as f:
-                    self.kb_embeddings = pickle.load(f)
-                print(f"Loaded {len(self.kb_embeddings)} KB embeddings from '{self.kb_embeddings_file}'.")
-            except (pickle.UnpicklingError, EOFError) as e:
-                print(f"Error loading embeddings file: {e}. Recreating...")
-                self._create_kb_embeddings()
-        else:
+        """Loads the KB keys and memory-maps their embedding matrix, creating them if they're missing or stale."""
+        kb_keys = list(self.persona.knowledge_base) if self.persona and self.persona.knowledge_base else []
+        try:
+            with open(self.kb_embeddings_file, 'r', encoding='utf-8') as f:
+                keys = json.load(f)
+            matrix = np.load(self.kb_matrix_file, mmap_mode='r')
+        except FileNotFoundError:
+            if self._migrate_legacy_kb_embeddings(kb_keys):
+                return
             print("KB embeddings file not found. Creating...")
             self._create_kb_embeddings()
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error loading embeddings file: {e}. Recreating...")
+            self._create_kb_embeddings()
+            return
+        if keys != kb_keys or len(matrix) != len(keys):
+            print("KB embeddings don't match the persona's knowledge base. Recreating...")
+            del matrix  # Release the mapping of the file that is about to be replaced
+            self._create_kb_embeddings()
+            return
+        # Saved rows are already normalized; checking would read the whole mapping in
+        self._set_kb(keys, matrix, normalized=True)
+        print(f"Loaded {len(self.kb_keys)} KB embeddings from '{self.kb_matrix_file}'.")
+
+    def _migrate_legacy_kb_embeddings(self, kb_keys: list[str]) -> bool:
+        """
+        Converts a pickled {key: vector} dict from older data/templates to the .json + .npy files.
+        Returns False (so the embeddings are recreated) if there is none or its keys don't match `kb_keys`.
+        """
+        if not os.path.exists(self.legacy_kb_embeddings_file):
+            return False
+        try:
+            with open(self.legacy_kb_embeddings_file, 'rb') as f:
+                kb_embeddings = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError) as e:
+            print(f"Error loading legacy embeddings file: {e}.")
+            return False
+        if not kb_embeddings:
+            return False
+        if set(kb_embeddings) != set(kb_keys):
+            print("Legacy KB embeddings don't match the persona's knowledge base. Recreating...")
+            return False
+        print(f"Converting {len(kb_keys)} KB embeddings from legacy file '{self.legacy_kb_embeddings_file}'.")
+        self._set_kb(kb_keys, np.stack([kb_embeddings[key] for key in kb_keys]))
+        self._save_kb_embeddings()
+        return True
+
+    def _set_kb(self, keys: list[str], matrix: np.ndarray, normalized: bool = False):
+        """Installs the KB keys and their embedding matrix, normalizing the rows unless they already are."""
+        if not keys:
+            self.kb_keys, self.kb_key_to_idx = [], {}
+            self.kb_matrix = np.empty((0, 0), dtype=np.float32)
+            return
+        if not normalized:
+            matrix = np.asarray(matrix, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            matrix = np.ascontiguousarray(matrix / norms)
+        self.kb_keys = list(keys)
+        self.kb_key_to_idx = {key: i for i, key in enumerate(self.kb_keys)}
+        self.kb_matrix = matrix
+
+    def search_kb(self, query_embedding, top_k: int = 3) -> list[tuple[str, float]]:
+        """Returns up to top_k (key, cosine similarity) pairs from the knowledge base, best first."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not self.kb_keys or norm == 0:
+            return []
+        top_idx, top_scores = vecsearch.topk_cosine(self.kb_matrix, query / norm, top_k)
+        return [(self.kb_keys[i], float(score)) for i, score in zip(top_idx, top_scores)]
 
     def _create_kb_embeddings(self):
-        """Generates embeddings for the knowledge base and saves them to a pickle file."""
+        """Generates embeddings for the knowledge base and saves them as the .json + .npy files."""
         if not self.persona or not self.persona.knowledge_base:
+            self._set_kb([], np.empty((0, 0), dtype=np.float32))
             return
 
         kb = self.persona.knowledge_base
         keys, values = zip(*kb.items())
         
         print(f"Generating embeddings for {len(values)} KB items...")
-        embeddings = MODELS.embedding_model.encode(list(values))
-        
-        self.kb_embeddings = {key: emb for key, emb in zip(keys, embeddings)}
+        # Encode every value in one call rather than queueing them through the batcher.
+        embeddings = MODELS.embedding_model.encode(
+            list(values),
+            batch_size=32,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
         
+        self._set_kb(list(keys), np.asarray(embeddings))
+        self._save_kb_embeddings()
+
+    def _save_kb_embeddings(self):
         try:
-            with open(self.kb_embeddings_file, 'wb') as f:
-                pickle.dump(self.kb_embeddings, f)
-            print(f"Saved {len(self.kb_embeddings)} KB embeddings to '{self.kb_embeddings_file}'.")
+            # Matrix first: a keys file is only ever written next to a matching matrix
+            with open(self.kb_matrix_file + ".tmp", 'wb') as f:
+                np.save(f, self.kb_matrix)
+            os.replace(self.kb_matrix_file + ".tmp", self.kb_matrix_file)
+            with open(self.kb_embeddings_file + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(self.kb_keys, f, ensure_ascii=False)
+            os.replace(self.kb_embeddings_file + ".tmp", self.kb_embeddings_file)
+            print(f"Saved {len(self.kb_keys)} KB embeddings to '{self.kb_matrix_file}'.")
         except IOError as e:
             print(f"Error saving embeddings file: {e}")
 
@@ -88,40 +176,81 @@ class CharacterManager:
         """
         if not self.persona:
             return "Persona not loaded."
+        if self._persona_text is not None:
+            return self._persona_text
 
         p = self.persona.character
         sp = p.speech_patterns
         ir = self.persona.interaction_rules
 
         # Start building the persona text
-        persona_text = "### Instructions ###\n"
-        persona_text += "You are an AI assistant. Role-play as the specified character according to the settings below.\n"
-        persona_text += "Your response must only be the character's response to the user's input. Absolutely do not include additional commentary or explanations.\n\n"
+        parts = [
+            "### Instructions ###\n",
+            "You are an AI assistant. Role-play as the specified character according to the settings below.\n",
+            "Your response must only be the character's response to the user's input. Absolutely do not include additional commentary or explanations.\n\n",
 
-        persona_text += "### Character Settings ###\n"
-        persona_text += f"Name: {p.name}\n"
-        persona_text += f"Persona: {p.persona}\n"
-        persona_text += f"Internal Conflict: {p.internal_conflict}\n\n"
+            "### Character Settings ###\n",
+            f"Name: {p.name}\n",
+            f"Persona: {p.persona}\n",
+            f"Internal Conflict: {p.internal_conflict}\n\n",
 
-        persona_text += "### Beliefs ###\n"
-        persona_text += "Your character holds the following core beliefs. These beliefs are the foundation of your responses.\n"
+            "### Beliefs ###\n",
+            "Your character holds the following core beliefs. These beliefs are the foundation of your responses.\n",
+        ]
         for belief in p.core_beliefs:
-            persona_text += f"- {belief}\n"
-        persona_text += "\n"
-        persona_text += "### Speech Pattern Rules ###\n"
-        persona_text += f"- Tone: {sp.tone}\n"
-        persona_text += f"- Use Short Sentences: {'Yes' if sp.use_short_sentences else 'No'}\n"
-        persona_text += f"- Show, Don't Tell Rule: {sp.show_dont_tell}\n\n"
-        
-        persona_text += "### Interaction Rules (Most Important) ###\n"
-        persona_text += "The following rules determine your actions. Follow them strictly.\n"
-        persona_text += f"- Your Hidden Goal: {ir.your_hidden_goal}\n"
-        persona_text += f"- Response to Simple Platitudes: {ir.on_receiving_simple_platitudes}\n"
-        persona_text += f"- Response to Genuine Questions: {ir.on_receiving_genuine_questions}\n"
-        persona_text += f"- Response to Insults: {ir.on_receiving_insults}\n"
-        persona_text += f"- Addressing the User: {ir.addressing_the_user}\n"
+            parts.append(f"- {belief}\n")
+        parts += [
+            "\n",
+            "### Speech Pattern Rules ###\n",
+            f"- Tone: {sp.tone}\n",
+            f"- Use Short Sentences: {'Yes' if sp.use_short_sentences else 'No'}\n",
+            f"- Show, Don't Tell Rule: {sp.show_dont_tell}\n\n",
 
-        return persona_text
+            "### Interaction Rules (Most Important) ###\n",
+            "The following rules determine your actions. Follow them strictly.\n",
+            f"- Your Hidden Goal: {ir.your_hidden_goal}\n",
+            f"- Response to Simple Platitudes: {ir.on_receiving_simple_platitudes}\n",
+            f"- Response to Genuine Questions: {ir.on_receiving_genuine_questions}\n",
+            f"- Response to Insults: {ir.on_receiving_insults}\n",
+            f"- Addressing the User: {ir.addressing_the_user}\n",
+        ]
+
+        # The persona only changes on reload or reflection, so build the text once until then
+        self._persona_text = "".join(parts)
+        return self._persona_text
+
+    @property
+    def persona_json(self) -> str:
+        """
+        The persona as indented JSON, for prompts that need the raw structure (e.g. the Reflector).
+        Serialized once and reused until the persona is reloaded or updated.
+        """
+        if self._persona_json is None and self.persona:
+            self._persona_json = jsonio.dumps(self.persona.model_dump(mode='json'), indent=True).decode('utf-8')
+        return self._persona_json or ""
+
+    def update_core_belief(self, old_belief: str, new_belief: str) -> bool:
+        """
+        Replaces one core belief in place and saves the persona.
+        Returns False if `old_belief` isn't one of the current beliefs.
+        """
+        core_beliefs = self.persona.character.core_beliefs
+        try:
+            i = core_beliefs.index(old_belief)
+        except ValueError:
+            return False
+        core_beliefs[i] = new_belief
+        self._persona_json = None
+        self._persona_text = None
+        try:
+            temp_file = self.persona_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(self.persona_json)
+            os.replace(temp_file, self.persona_file)
+            print(f"--- Core Persona has been updated and saved by the Reflector ---")
+        except Exception as e:
+            print(f"--- Failed to update and save persona: {e} ---")
+        return True
 
     def update_and_save_persona(self, new_persona_dict: dict):
         """
@@ -130,10 +259,12 @@ class CharacterManager:
         """
         try:
             self.persona = CorePersona(**new_persona_dict)
+            self._persona_json = None
+            self._persona_text = None
             
             temp_file = self.persona_file + ".tmp"
             with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(new_persona_dict, f, indent=2)
+                f.write(jsonio.dumps(new_persona_dict, indent=True).decode('utf-8'))
             
             os.replace(temp_file, self.persona_file)
             print(f"--- Core Persona has been updated and saved by the Reflector ---")
@@ -33,10 +33,10 @@ class Curator:
         print("\n--- 新しい記憶をキュレーション中... ---")
 
         # Prepare the context for the LLM
-        prompt_context = "<conversation_turn>\n"
-        for turn in conversation_turn:
-            prompt_context += f"{turn.speaker}: {turn.message}\n"
-        prompt_context += "</conversation_turn>"
+        lines = ["<conversation_turn>"]
+        lines.extend(f"{turn.speaker}: {turn.message}" for turn in conversation_turn)
+        lines.append("</conversation_turn>")
+        prompt_context = "\n".join(lines)
 
         # Call the LLM with the powerful prompt
         response_json = self.llm.call(
@@ -52,8 +52,9 @@ class Curator:
         try:
             curated_memory_text = response_json["curated_memory"]
             
-            # Generate the embedding for the new memory
-            embedding = MODELS.embedding_model.encode(curated_memory_text).tolist()
+            # Generate the embedding for the new memory. Goes through the batcher so
+            # concurrent turns (e.g. from the web UI) share one forward pass.
+            embedding = MODELS.batcher.encode(curated_memory_text).tolist()
             
             # Create the structured memory entry
             memory_entry = EpisodicMemoryEntry(
@@ -1,59 +1,294 @@
 import json
 import os
+import threading
 from typing import List
 import numpy as np
 from schemas import EpisodicMemoryEntry
+import jsonio
+from vecsearch import quantize_int8, topk_cosine, topk_dot_int8
+
+# Rewrite the log once this many appended entries are carrying their embedding inline
+COMPACT_AFTER_APPENDS = 50
+# Set POTATO_MEMORY_INT8=1 to search an int8 copy of the embeddings (one scale per row).
+# The scan then reads a quarter of the bytes; scores shift by well under 0.01, so check
+# recall on your memories before relying on it. The .npy file stays float32.
+MEMORY_INT8 = os.getenv("POTATO_MEMORY_INT8", "0") == "1"
 # Assume a global or passed-in embedding model, for now.
 # from models import MODELS # We will create this later
 
+class ProximityCache:
+    """
+    A small LRU cache of recent search results keyed by query embedding.
+    A query whose cosine similarity to a cached query is at least 1 - tau reuses
+    that query's results, so paraphrased follow-ups skip the scan over all memories.
+    """
+    def __init__(self, capacity: int = 128, tau: float = 0.05):
+        self.capacity = capacity
+        self.threshold = 1.0 - tau
+        self._keys: np.ndarray | None = None  # (capacity, d) normalized query vectors
+        self._entries: list[tuple[int, list[int]]] = []  # (top_k, memory indices) per row
+        self._last_used: list[int] = []
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, query: np.ndarray, top_k: int) -> list[int] | None:
+        """Returns the cached memory indices for a near-duplicate query, or None on a miss."""
+        if self._entries:
+            scores = self._keys[:len(self._entries)] @ query
+            i = int(np.argmax(scores))
+            if scores[i] >= self.threshold and self._entries[i][0] == top_k:
+                self._clock += 1
+                self._last_used[i] = self._clock
+                self.hits += 1
+                return self._entries[i][1]
+        self.misses += 1
+        return None
+
+    def put(self, query: np.ndarray, top_k: int, indices: list[int]):
+        if self._keys is None or self._keys.shape[1] != query.shape[0]:
+            self._keys = np.empty((self.capacity, query.shape[0]), dtype=np.float32)
+            self._entries, self._last_used = [], []
+        self._clock += 1
+        if len(self._entries) < self.capacity:
+            i = len(self._entries)
+            self._entries.append((top_k, indices))
+            self._last_used.append(self._clock)
+        else:
+            i = int(np.argmin(self._last_used))  # Evict the least recently used entry
+            self._entries[i] = (top_k, indices)
+            self._last_used[i] = self._clock
+        self._keys[i] = query
+
+    def clear(self):
+        """Drops every cached result, e.g. after a new memory changes what a search would return."""
+        self._entries, self._last_used = [], []
+
 class EpisodicMemoryManager:
     """
-    Manages loading, searching, and saving episodic memories to a JSON file.
+    Manages loading, searching, and saving episodic memories to an append-only JSONL log.
+    Embeddings live in one L2-normalized float32 matrix (row i belongs to memories[i]),
+    saved as a .npy file next to the log. Compacted log lines refer to their row with
+    "emb_row"; lines appended since the last compaction carry their embedding inline
+    until the next compaction folds them into the .npy file.
     """
     def __init__(self, memory_file: str):
         self.memory_file = memory_file
+        self.embeddings_file = memory_file + ".npy"
+        # Memories used to be saved as one JSON array; it's migrated on first load
+        self.legacy_memory_file = os.path.splitext(memory_file)[0] + ".json"
         self.memories: List[EpisodicMemoryEntry] = []
+        self.query_cache = ProximityCache()
+        # Preallocated and doubled when full; only the first len(self.memories) rows are used
+        self._emb_matrix: np.ndarray | None = None
+        # int8 copy of the matrix for MEMORY_INT8 searches; rows below _quantized_rows are up to date
+        self._emb_q: np.ndarray | None = None
+        self._emb_scales: np.ndarray | None = None
+        self._quantized_rows = 0
+        self._pending_appends = 0
+        self._compacting = False
+        # Guards the files and the memory list/matrix while a background compaction runs
+        self._file_lock = threading.RLock()
         self._load_memories()
 
     def _load_memories(self):
-        """Loads memories from the JSON file if it exists."""
-        if os.path.exists(self.memory_file) and os.path.getsize(self.memory_file) > 0:
-            try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    memory_data = json.load(f)
-                    self.memories = [EpisodicMemoryEntry(**data) for data in memory_data]
-                print(f"Loaded {len(self.memories)} memories from '{self.memory_file}'.")
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"Could not load memories from '{self.memory_file}': {e}. Starting fresh.")
-                self.memories = []
+        """Loads memories from the JSONL log (or a legacy JSON file) and their embeddings from the .npy file."""
+        self.memories = []
+        self._emb_matrix = None
+        self._quantized_rows = 0
+        if os.path.exists(self.memory_file):
+            self._load_log()
+        elif self.legacy_memory_file != self.memory_file and os.path.exists(self.legacy_memory_file):
+            self._load_legacy()
         else:
             print(f"No memory file found at '{self.memory_file}'. Starting with an empty memory.")
+
+    def _load_log(self):
+        lines = []
+        damaged = False
+        with open(self.memory_file, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    lines.append(jsonio.loads(line))
+                except ValueError as e:  # e.g. a line cut short by a crash mid-append
+                    print(f"Skipping unreadable line {line_number} in '{self.memory_file}': {e}")
+                    damaged = True
+
+        stored = None
+        if any('emb_row' in data for data in lines):
+            try:
+                # Memory-mapped, so startup doesn't read the matrix unless it has to copy rows out of it
+                stored = np.load(self.embeddings_file, mmap_mode='r')
+            except (OSError, ValueError) as e:
+                print(f"Could not load memory embeddings from '{self.embeddings_file}': {e}.")
+
+        inline_rows = {}
+        in_order = True
+        self._pending_appends = 0
+        for data in lines:
+            emb_row = data.pop('emb_row', None)
+            embedding = data.pop('embedding', None)
+            try:
+                self.memories.append(EpisodicMemoryEntry(**data))
+            except (TypeError, ValueError) as e:
+                print(f"Skipping invalid memory in '{self.memory_file}': {e}")
+                continue
+            i = len(self.memories) - 1
+            if embedding:
+                inline_rows[i] = embedding
+                self._pending_appends += 1
+            elif emb_row is not None and stored is not None and emb_row < len(stored):
+                inline_rows[i] = stored[emb_row]
+            in_order = in_order and emb_row in (None, i)
+
+        if stored is not None and in_order and not self._pending_appends and len(stored) == len(self.memories):
+            self._emb_matrix = stored  # Already compacted and in order: use the mapping directly
+        else:
+            for i, embedding in inline_rows.items():
+                self._set_row(i, embedding)
+        print(f"Loaded {len(self.memories)} memories from '{self.memory_file}'.")
+        if damaged:
+            self.save_memories()  # Rewrite the log so new appends don't follow a partial line
+
+    def _load_legacy(self):
+        try:
+            with open(self.legacy_memory_file, 'r', encoding='utf-8') as f:
+                memory_data = json.load(f)
+            for data in memory_data:
+                embedding = data.pop('embedding', None)
+                self.memories.append(EpisodicMemoryEntry(**data))
+                if embedding:
+                    self._set_row(len(self.memories) - 1, embedding)
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            print(f"Could not load memories from '{self.legacy_memory_file}': {e}. Starting fresh.")
             self.memories = []
+            self._emb_matrix = None
+            return
+        # Older JSON files may have kept embeddings in a .npy next to them
+        if self._emb_matrix is None and self.memories:
+            try:
+                stored = np.load(self.legacy_memory_file + ".npy")
+                if len(stored) == len(self.memories):
+                    self._emb_matrix = np.array(stored, dtype=np.float32)
+            except (OSError, ValueError):
+                pass
+        print(f"Loaded {len(self.memories)} memories from legacy file '{self.legacy_memory_file}'. Converting to '{self.memory_file}'.")
+        self.save_memories()
+
+    def _set_row(self, i: int, embedding):
+        """Stores the normalized embedding for memories[i], growing the matrix as needed."""
+        row = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(row)
+        if norm > 0:
+            row = row / norm
+        if self._emb_matrix is None:
+            self._emb_matrix = np.zeros((max(16, i + 1), row.shape[0]), dtype=np.float32)
+        elif i >= len(self._emb_matrix) or not self._emb_matrix.flags.writeable:
+            grown = np.zeros((max(16, 2 * len(self._emb_matrix), i + 1), self._emb_matrix.shape[1]), dtype=np.float32)
+            grown[:len(self._emb_matrix)] = self._emb_matrix
+            self._emb_matrix = grown
+        self._emb_matrix[i] = row
+        self._quantized_rows = min(self._quantized_rows, i)
+
+    def _sync_quantized(self, n: int):
+        """Quantizes the matrix rows added or changed since the last int8 search."""
+        if self._emb_q is None or self._emb_q.shape[1] != self._emb_matrix.shape[1] or len(self._emb_q) < n:
+            capacity = len(self._emb_matrix)
+            q = np.zeros((capacity, self._emb_matrix.shape[1]), dtype=np.int8)
+            scales = np.zeros(capacity, dtype=np.float32)
+            if self._emb_q is not None and self._emb_q.shape[1] == q.shape[1]:
+                kept = min(self._quantized_rows, len(self._emb_q))
+                q[:kept], scales[:kept] = self._emb_q[:kept], self._emb_scales[:kept]
+                self._quantized_rows = kept
+            else:
+                self._quantized_rows = 0
+            self._emb_q, self._emb_scales = q, scales
+        start = self._quantized_rows
+        if start < n:
+            self._emb_q[start:n], self._emb_scales[start:n] = quantize_int8(self._emb_matrix[start:n])
+            self._quantized_rows = n
+
+    def _has_embedding(self, i: int) -> bool:
+        # Trailing memories without embeddings may have no row yet
+        return self._emb_matrix is not None and i < len(self._emb_matrix) and bool(self._emb_matrix[i].any())
 
     def save_memories(self):
         """
-        Saves the current in-memory list of memories to the JSON file system
-        using an atomic copy-on-write strategy.
+        Rewrites the whole log (compaction): every embedding goes into the .npy file and each
+        line refers to its row. Both files are written to temp files and swapped in atomically.
         """
         temp_file = self.memory_file + ".tmp"
-        try:
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                # Pydantic models must be converted to dicts for JSON serialization
-                json.dump([mem.dict() for mem in self.memories], f, indent=2, default=str)
-            
-            os.replace(temp_file, self.memory_file)
-            print(f"Successfully saved {len(self.memories)} memories to '{self.memory_file}'.")
-        except Exception as e:
-            print(f"Error saving memories: {e}")
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        temp_emb_file = self.embeddings_file + ".tmp"
+        with self._file_lock:
+            try:
+                n = len(self.memories)
+                if self._emb_matrix is not None:
+                    rows = self._emb_matrix[:n]
+                    if len(rows) < n:  # One row per memory, so emb_row always indexes the saved matrix
+                        rows = np.concatenate([rows, np.zeros((n - len(rows), rows.shape[1]), dtype=np.float32)])
+                    with open(temp_emb_file, 'wb') as f:
+                        np.save(f, rows)
+
+                with open(temp_file, 'wb') as f:
+                    for i, mem in enumerate(self.memories):
+                        data = mem.model_dump(mode='json', exclude={'embedding'})
+                        if self._has_embedding(i):
+                            data['emb_row'] = i
+                        f.write(jsonio.dumps_line(data))
+
+                # Swap the matrix in only once both files are written
+                if self._emb_matrix is not None:
+                    os.replace(temp_emb_file, self.embeddings_file)
+                os.replace(temp_file, self.memory_file)
+                self._pending_appends = 0
+                print(f"Successfully saved {len(self.memories)} memories to '{self.memory_file}'.")
+            except Exception as e:
+                print(f"Error saving memories: {e}")
+                for path in (temp_file, temp_emb_file):
+                    if os.path.exists(path):
+                        os.remove(path)
+            finally:
+                self._compacting = False
 
     def add_memory(self, memory_entry: EpisodicMemoryEntry):
-        """Adds a new memory entry and saves the updated list."""
-        self.memories.append(memory_entry)
-        self.save_memories()
+        """Adds a new memory entry and appends it to the log."""
+        embedding = memory_entry.embedding
+        data = memory_entry.model_dump(mode='json', exclude={'embedding'})
+        if embedding:
+            data['embedding'] = embedding
+
+        with self._file_lock:
+            i = len(self.memories)
+            if embedding:
+                self._set_row(i, embedding)
+                # The vector lives in the matrix; keep the caller's entry untouched
+                memory_entry = memory_entry.model_copy(update={'embedding': []})
+            elif self._emb_matrix is not None:
+                self._set_row(i, np.zeros(self._emb_matrix.shape[1], dtype=np.float32))
+            self.memories.append(memory_entry)
+            self.query_cache.clear()
+            try:
+                with open(self.memory_file, 'ab') as f:
+                    f.write(jsonio.dumps_line(data))
+                self._pending_appends += 1
+            except OSError as e:
+                print(f"Error appending memory: {e}")
+
+            compact = self._pending_appends >= COMPACT_AFTER_APPENDS and not self._compacting
+            if compact:
+                self._compacting = True
         print(f"Added new memory. Total memories: {len(self.memories)}.")
 
+        if compact:
+            threading.Thread(target=self.save_memories, name="memory-compaction", daemon=True).start()
+
     def get_recent_memories(self, num_memories: int) -> List[EpisodicMemoryEntry]:
         """Returns the most recent 'n' memories."""
         return self.memories[-num_memories:]
@@ -62,21 +297,33 @@ class EpisodicMemoryManager:
         """
         Searches for the most relevant memories based on an embedding.
         """
-        if not self.memories:
+        if not self.memories or self._emb_matrix is None:
             return []
 
-        query_emb = np.array(query_embedding)
-        
-        # Calculate cosine similarities
-        scores = []
-        for mem in self.memories:
-            if mem.embedding:
-                mem_emb = np.array(mem.embedding)
-                scores.append(np.dot(query_emb, mem_emb) / (np.linalg.norm(query_emb) * np.linalg.norm(mem_emb)))
-            else:
-                scores.append(0)
-        
-        # Get top_k results
-        top_indices = np.argsort(scores)[-top_k:][::-1]
+        query_emb = np.array(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_emb)
+        if query_norm == 0:
+            return []
+        query_emb /= query_norm
+
+        # Memories are only ever appended, and add_memory clears the cache, so cached
+        # indices into self.memories stay valid
+        cached_indices = self.query_cache.get(query_emb, top_k)
+        if cached_indices is not None:
+            return [self.memories[i] for i in cached_indices]
+
+        # Rows and query are unit-length, so the dot products are cosine similarities
+        n = len(self.memories)
+        if MEMORY_INT8:
+            n = min(n, len(self._emb_matrix))  # Trailing memories without embeddings may have no row yet
+            with self._file_lock:
+                self._sync_quantized(n)
+                emb_q, emb_scales = self._emb_q[:n], self._emb_scales[:n]
+            query_q, query_scale = quantize_int8(query_emb)
+            top_indices, top_scores = topk_dot_int8(emb_q, emb_scales, query_q, float(query_scale), top_k)
+        else:
+            top_indices, top_scores = topk_cosine(self._emb_matrix[:n], query_emb, top_k)
         
-        return [self.memories[i] for i in top_indices if scores[i] > 0]
+        result_indices = [int(i) for i, score in zip(top_indices, top_scores) if score > 0]
+        self.query_cache.put(query_emb, top_k, result_indices)
+        return [self.memories[i] for i in result_indices]
@@ -0,0 +1,24 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module if orjson isn't installed
+    orjson = None
+
+def loads(data: bytes | str):
+    """Parses JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj, indent: bool = False) -> bytes:
+    """Serializes an object to UTF-8 JSON bytes (indented by two spaces if `indent`), using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
+def dumps_line(obj: dict) -> bytes:
+    """Serializes an object as one newline-terminated JSONL record."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode('utf-8')
@@ -1,11 +1,50 @@
 from ollama import Client
+import httpx
 import json
+import os
+import threading
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib parser if orjson isn't installed
+    orjson = None
+
+def _parse_json(content: str) -> dict:
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass  # Let the stdlib parser have a go (it accepts NaN/Infinity, for example)
+    return json.loads(content)
+
+# Seconds to wait for an Ollama response before giving up. Unset (the default) waits
+# indefinitely: a cold or CPU-only model load can take minutes on the first call.
+LLM_TIMEOUT = float(os.getenv("POTATO_LLM_TIMEOUT", "0")) or None
+
+# One ollama Client (and so one httpx connection pool) per host, shared by every backend.
+# The bot talks to a single local Ollama server, so keep-alive connections are reused
+# across the main, curator and reflector calls instead of each backend opening its own.
+_CLIENTS: dict[str, Client] = {}
+_BACKENDS: dict[tuple[str, str], "LLMBackend"] = {}
+_lock = threading.RLock()
+
+def _get_client(host: str) -> Client:
+    with _lock:
+        if host not in _CLIENTS:
+            # Extra kwargs are passed through to httpx.Client
+            _CLIENTS[host] = Client(host=host, timeout=LLM_TIMEOUT, limits=httpx.Limits(max_keepalive_connections=8))
+        return _CLIENTS[host]
 
 class LLMBackend:
     """A simple wrapper for the Ollama API client."""
-    def __init__(self, model_name: str, host: str = "http://localhost:11434"):
-        self.client = Client(host=host)
+    def __init__(self, model_name: str, host: str = "http://localhost:11434", keep_alive: str = "30m", num_ctx: int = 4096):
+        self.client = _get_client(host)
         self.model_name = model_name
+        # Ollama reuses the KV cache of a loaded model for a matching prompt prefix, so keep
+        # the model resident between turns and pin num_ctx (changing it reloads the model).
+        # The persona system prompt is then only prefilled once, not on every call.
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
 
     def call(self, system: str, prompt: str, temperature: float = 0.5) -> dict:
         """Makes a call to the LLM and returns the parsed JSON response."""
@@ -17,9 +56,18 @@ class LLMBackend:
                     {"role": "user", "content": prompt}
                 ],
                 format="json",
-                options={"temperature": temperature}
+                options={"temperature": temperature, "num_ctx": self.num_ctx},
+                keep_alive=self.keep_alive
             )
-            return json.loads(response['message']['content'])
+            return _parse_json(response['message']['content'])
         except Exception as e:
             print(f"Error calling LLM: {e}")
             return {"error": str(e)}
+
+def get_backend(model_name: str, host: str = "http://localhost:11434") -> LLMBackend:
+    """Returns the shared LLMBackend for a model, so roles that use the same model share one instance."""
+    with _lock:
+        key = (model_name, host)
+        if key not in _BACKENDS:
+            _BACKENDS[key] = LLMBackend(model_name, host=host)
+        return _BACKENDS[key]
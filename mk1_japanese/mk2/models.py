@@ -1,5 +1,97 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from sentence_transformers import SentenceTransformer
 
+# Precision for the embedding model: "fp32" (default), "int8" (CPU only) or "fp16" (CUDA only).
+# int8 swaps every Linear layer for a dynamically quantized kernel; check search quality
+# against fp32 before relying on it.
+EMBED_DTYPE = os.getenv("POTATO_EMBED_DTYPE", "fp32").lower()
+
+def _apply_embed_dtype(model, dtype: str):
+    """
+    Converts the embedding model to the requested precision, if supported on its device.
+    Returns the model and the precision actually applied ("fp32" when it fell back).
+    """
+    import torch
+    device = model.device.type
+    if dtype == "int8":
+        if device == "cpu":
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8), "int8"
+        print("POTATO_EMBED_DTYPE=int8 is only supported on CPU. Keeping fp32.")
+    elif dtype == "fp16":
+        if device == "cuda":
+            return model.half(), "fp16"
+        print("POTATO_EMBED_DTYPE=fp16 requires a CUDA device. Keeping fp32.")
+    elif dtype != "fp32":
+        print(f"Unknown POTATO_EMBED_DTYPE '{dtype}'. Keeping fp32.")
+    return model, "fp32"
+
+class EmbeddingBatcher:
+    """
+    Coalesces single-text encode requests into one batched encode() call.
+    Requests are collected for up to `max_wait_ms`, or until `max_batch_size`
+    are pending, so concurrent callers share a single forward pass.
+    """
+    def __init__(self, registry: "ModelRegistry", max_batch_size: int = 16, max_wait_ms: float = 20):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def encode_async(self, text: str) -> Future:
+        """Queues a text for embedding and returns a Future resolving to its vector."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str):
+        """Blocking convenience wrapper around encode_async."""
+        return self.encode_async(text).result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.registry.embedding_model.encode(
+                    texts,
+                    batch_size=self.max_batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
 class ModelRegistry:
     """
     A simple class to hold our initialized models.
@@ -8,8 +100,16 @@ class ModelRegistry:
     def __init__(self):
         # Using a smaller, efficient model.
         # You can swap this for any other SentenceTransformer model.
-        self.embedding_model = SentenceTransformer('cl-nagoya/ruri-v3-70m')
-        print("Embedding model loaded.")
+        self.embedding_model, embed_dtype = _apply_embed_dtype(SentenceTransformer('cl-nagoya/ruri-v3-70m'), EMBED_DTYPE)
+        print(f"Embedding model loaded ({embed_dtype}).")
+        self.batcher = EmbeddingBatcher(self)
+
+    def warm_up(self):
+        """
+        Runs a tiny batch through the embedding model so the tokenizer, weights and
+        thread pools are initialized before the first real request needs them.
+        """
+        self.embedding_model.encode(["warmup"] * 2, batch_size=2, show_progress_bar=False)
 
 # Create a single instance of the registry to be imported by other modules
 MODELS = ModelRegistry()
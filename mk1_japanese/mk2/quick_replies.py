@@ -0,0 +1,60 @@
+import numpy as np
+from models import MODELS
+
+# Short, self-contained inputs that don't need the full monologue/hint chain,
+# mapped to canned replies in the character's voice. `{name}` is the persona's name.
+QUICK_REPLIES = {
+    "…こんにちは。{name}、です。": [
+        "こんにちは", "こんばんは", "おはよう", "おはようございます", "やあ", "はじめまして", "もしもし",
+    ],
+    "…どういたしまして。": [
+        "ありがとう", "ありがとうございます", "どうもありがとう", "感謝します", "サンキュー",
+    ],
+    "…うん。また、ね。": [
+        "さようなら", "またね", "じゃあね", "バイバイ", "おやすみ", "おやすみなさい",
+    ],
+    "…うん。": [
+        "はい", "うん", "そうだね", "なるほど", "わかった", "了解", "オッケー",
+    ],
+    "…ううん、大丈夫。": [
+        "ごめん", "ごめんなさい", "すみません",
+    ],
+}
+
+# Longer messages always go to the LLM, however close their embedding is to a prototype
+QUICK_REPLY_MAX_CHARS = 20
+
+class QuickReplyBank:
+    """
+    Matches trivial inputs ("こんにちは", "ありがとう", ...) against prototype embeddings
+    so they can be answered without calling the LLM.
+    """
+    def __init__(self, replies: dict[str, list[str]] = QUICK_REPLIES, threshold: float = 0.9):
+        self.threshold = threshold
+        self._responses = []
+        prototypes = []
+        for response, inputs in replies.items():
+            for text in inputs:
+                prototypes.append(text)
+                self._responses.append(response)
+        # One batched encode at startup; rows are normalized so scores are cosine similarities
+        matrix = np.asarray(MODELS.embedding_model.encode(prototypes, batch_size=32, show_progress_bar=False), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self._prototypes = matrix / norms
+        print(f"Quick reply bank ready ({len(prototypes)} prototypes).")
+
+    def match(self, user_input: str) -> tuple[str, float] | None:
+        """Returns (response template, score) if the input is close enough to a prototype, else None."""
+        text = user_input.strip()
+        if not text or len(text) > QUICK_REPLY_MAX_CHARS:
+            return None
+        query = np.asarray(MODELS.batcher.encode(text), dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        scores = self._prototypes @ (query / norm)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return self._responses[best], float(scores[best])
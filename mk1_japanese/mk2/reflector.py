@@ -1,5 +1,6 @@
+from string import Template
 from typing import List, Dict, Any
-from schemas import CorePersona, EpisodicMemoryEntry
+from schemas import EpisodicMemoryEntry
 from llm import LLMBackend
 
 # The "Therapist" prompt for the Reflector LLM
@@ -25,6 +26,11 @@ You must respond with a single JSON object with the following keys:
 **Important**: Do not change a belief after only a few positive interactions. Look for a clear pattern of sustained effort and understanding. When in doubt, default to `"change_needed": false`.
 """
 
+# Parsed once at import; filled in per reflection with the persona JSON and memory list
+_REFLECTOR_PROMPT = Template(
+    "**Core Persona for Analysis:**\n$persona_json\n\n**Recent Episodic Memories for Analysis:**\n$memories"
+)
+
 class Reflector:
     """
     Analyzes recent memories and proposes changes to the core persona.
@@ -33,9 +39,10 @@ class Reflector:
         # The Reflector might need a more powerful model to do its reasoning.
         self.llm = llm_backend
 
-    def reflect_and_propose_change(self, persona: CorePersona, recent_memories: List[EpisodicMemoryEntry]) -> Dict[str, Any] | None:
+    def reflect_and_propose_change(self, persona_json: str, recent_memories: List[EpisodicMemoryEntry]) -> Dict[str, Any] | None:
         """
         Uses an LLM to analyze memories and propose a change to the persona.
+        `persona_json` is the serialized persona (CharacterManager.persona_json).
         """
         print("\n--- スローリフレクションを開始... ---")
 
@@ -44,12 +51,11 @@ class Reflector:
             return None
 
         # Prepare the context for the LLM
-        prompt_context = "**Core Persona for Analysis:**\n"
-        prompt_context += persona.json(indent=2)
-        
-        prompt_context += "\n\n**Recent Episodic Memories for Analysis:**\n"
-        for mem in recent_memories:
-            prompt_context += f"- Turn {mem.turn_number}: {mem.curated_memory} (Valence: {mem.emotional_valence})\n"
+        memories = "".join(
+            f"- Turn {mem.turn_number}: {mem.curated_memory} (Valence: {mem.emotional_valence})\n"
+            for mem in recent_memories
+        )
+        prompt_context = _REFLECTOR_PROMPT.substitute(persona_json=persona_json, memories=memories)
         
         # Call the LLM with the powerful prompt
         response_json = self.llm.call(
@@ -7,12 +7,17 @@ class SotaSocket:
         self.port = port
         self.bot_name = bot_name
         self.socket = None
+        # Bytes received after the last delimiter, kept for the next receive_message_buffer call
+        self._pending = bytearray()
 
     def connect(self):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
+            # Options must be set before connect() to apply to this connection.
+            # Commands are short lines, so disable Nagle's algorithm rather than let them wait to be coalesced.
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket.connect((self.host, self.port))
             
             # Register the bot with the server
             init_message = f"name;{self.bot_name}\n"
@@ -36,7 +41,7 @@ class SotaSocket:
         else:
             print("Not connected to Sota server.")
 
-    def receive_message_buffer(self, buffer_size=1024, delimiter="GPTCmd"):
+    def receive_message_buffer(self, buffer_size=65536, delimiter="GPTCmd"):
         """
         Receives and buffers data from the socket until a delimiter is found.
         This is a more robust way to handle messages that might be split into multiple packets.
@@ -44,26 +49,35 @@ class SotaSocket:
         if not self.socket:
             return None
 
-        all_data = ""
+        # Accumulate raw bytes and decode once per message: bytearray appends are amortized O(1),
+        # and a multi-byte character split across two packets is decoded whole.
+        buf = self._pending
+        delim = delimiter.encode("utf-8")
+        search_from = 0
         while True:
+            idx = buf.find(delim, search_from)
+            if idx >= 0:
+                # Return the message part before the delimiter and keep the rest for the next call
+                message = buf[:idx].decode("utf-8", errors="replace")
+                self._pending = buf[idx + len(delim):]
+                return message
+            # The delimiter may straddle the next chunk, so rescan the tail of what we have
+            search_from = max(0, len(buf) - len(delim) + 1)
+
             try:
-                data = self.socket.recv(buffer_size).decode("utf-8")
+                data = self.socket.recv(buffer_size)
                 if not data:
                     # Connection closed by server
                     print("Connection closed by the server.")
                     self.socket = None
+                    self._pending = bytearray()
                     return None
-                
-                all_data += data
-                if delimiter in all_data:
-                    # Return the message part before the delimiter
-                    message = all_data.split(delimiter)[0]
-                    # You might want to handle the part after the delimiter if multiple commands can arrive in one batch
-                    return message
+                buf.extend(data)
 
             except socket.error as e:
                 print(f"Failed to receive message: {e}")
                 self.socket = None
+                self._pending = bytearray()
                 return None
 
     def close(self):
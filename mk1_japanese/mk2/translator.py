@@ -1,46 +1,240 @@
+import contextlib
+import os
+import threading
+from collections import OrderedDict
+import torch
+from typing import List
 from transformers import MarianMTModel, MarianTokenizer
 
+try:
+    import ctranslate2
+except ImportError:  # Fall back to PyTorch generate() if CTranslate2 isn't installed
+    ctranslate2 = None
+
+# Precision for the MarianMT models:
+#   "auto" (default) - int8 on CPU, fp16 on CUDA
+#   "int8"           - dynamic int8 quantization of the Linear layers (CPU only)
+#   "bf16"           - bfloat16 autocast on CPU (needs a CPU with native bf16 support to pay off)
+#   "fp16"           - float16 autocast (CUDA only)
+#   "fp32"           - no conversion, to compare output quality
+# Generation is bound by the Linear layers, so the reduced precisions cut the bytes moved
+# through them on each of the turn's two translations.
+TRANSLATE_DTYPE = os.getenv("POTATO_TRANSLATE_DTYPE", "auto").lower()
+# Set POTATO_TRANSLATE_COMPILE=1 to run the models' forward pass through torch.compile.
+# generate() calls the decoder once per output token, so the per-step Python dispatch
+# is a large share of a short translation. Compiling takes a while at startup.
+TRANSLATE_COMPILE = os.getenv("POTATO_TRANSLATE_COMPILE", "0") == "1"
+# Directory holding CTranslate2 conversions of the models, one subdirectory per model
+# (e.g. ct2/opus-mt-ja-en, ct2/fugumt-en-ja). Where a conversion exists and ctranslate2 is
+# installed it replaces the PyTorch model: its int8 C++ runtime is several times faster on CPU.
+# Convert once with:
+#   ct2-transformers-converter --model Helsinki-NLP/opus-mt-ja-en --output_dir ct2/opus-mt-ja-en --quantization int8
+#   ct2-transformers-converter --model staka/fugumt-en-ja --output_dir ct2/fugumt-en-ja --quantization int8
+CT2_DIR = os.getenv("POTATO_CT2_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ct2"))
+# CPU threads for torch ops. Generation is a loop of small, memory-bound matmuls, where
+# spreading each one over every core on a large host costs more in cache traffic than it gains.
+TORCH_THREADS = int(os.getenv("POTATO_TORCH_THREADS", min(8, os.cpu_count() or 1)))
+MAX_INPUT_TOKENS = 256  # Longer inputs are truncated rather than blowing up the batch
+# Replies and user messages are a sentence or two; the cap stops a degenerate repetition
+# loop from decoding up to the model's max_length (512) before it ends
+MAX_NEW_TOKENS = 128
+
+def _resolve_dtype(dtype: str, device: str) -> str:
+    """Picks the precision to use on this device, falling back to fp32 if it isn't supported."""
+    if dtype == "auto":
+        return "fp16" if device == "cuda" else "int8"
+    if dtype == "int8" and device != "cpu":
+        print("POTATO_TRANSLATE_DTYPE=int8 is only supported on CPU. Using fp16.")
+        return "fp16"
+    if dtype == "fp16" and device != "cuda":
+        print("POTATO_TRANSLATE_DTYPE=fp16 requires a CUDA device. Keeping fp32.")
+        return "fp32"
+    if dtype == "bf16" and device == "cpu":
+        # bf16 autocast on CPU needs torch>=2.1
+        try:
+            with torch.autocast(device_type="cpu", dtype=torch.bfloat16):
+                pass
+        except (RuntimeError, TypeError) as e:
+            print(f"bf16 autocast is not available on this CPU ({e}). Keeping fp32.")
+            return "fp32"
+    if dtype not in ("int8", "bf16", "fp16", "fp32"):
+        print(f"Unknown POTATO_TRANSLATE_DTYPE '{dtype}'. Keeping fp32.")
+        return "fp32"
+    return dtype
+
+TRANSLATION_ERROR = "[Translation Error]"
+
+def _configure_torch_threads(dtype: str):
+    """Caps torch's CPU thread pools before the models load. The settings are process-wide."""
+    torch.set_num_threads(TORCH_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only settable before the first inter-op parallel work (e.g. an embedding) runs
+    torch.backends.mkldnn.enabled = True
+    if dtype == "bf16":
+        # Let fp32 matmuls outside autocast use reduced-precision kernels too
+        torch.set_float32_matmul_precision("medium")
+
+class TranslationCache:
+    """
+    A thread-safe LRU cache of recent translations keyed by whitespace-normalized text,
+    so repeated phrases (greetings, stock replies) skip generate() entirely.
+    """
+    def __init__(self, capacity: int = 512):
+        self.capacity = capacity
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            translation = self._entries.get(key)
+            if translation is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return translation
+
+    def put(self, key: str, translation: str):
+        with self._lock:
+            self._entries[key] = translation
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)  # Evict the least recently used entry
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
 class Translator:
     """A class to handle Japanese-English and English-Japanese translation."""
     def __init__(self):
         print("--- Initializing Translation Models ---")
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.dtype = _resolve_dtype(TRANSLATE_DTYPE, self.device)
+        _configure_torch_threads(self.dtype)
+        self.ja_en_cache = TranslationCache()
+        self.en_ja_cache = TranslationCache()
         try:
             # Load Japanese to English model
             self.ja_en_model_name = 'Helsinki-NLP/opus-mt-ja-en'
             self.ja_en_tokenizer = MarianTokenizer.from_pretrained(self.ja_en_model_name)
-            self.ja_en_model = MarianMTModel.from_pretrained(self.ja_en_model_name, use_safetensors=True)
+            self.ja_en_model = self._load_model(self.ja_en_model_name)
             print("  - Japanese to English model loaded.")
 
             # Load English to Japanese model - SWITCHING TO FUGUMT
-            self.en_ja_model_name = 'staka/fugumt-en-ja' 
+            self.en_ja_model_name = 'staka/fugumt-en-ja'
             self.en_ja_tokenizer = MarianTokenizer.from_pretrained(self.en_ja_model_name)
-            self.en_ja_model = MarianMTModel.from_pretrained(self.en_ja_model_name, use_safetensors=True)
+            self.en_ja_model = self._load_model(self.en_ja_model_name)
             print("  - English to Japanese model loaded.")
-            print("--- Translation Models Initialized Successfully ---")
+            if TRANSLATE_COMPILE:
+                # Pay the compile cost now rather than on the first chat turn
+                self.warm_up()
+            print(f"--- Translation Models Initialized Successfully ({self.device}, {self.dtype}) ---")
         except Exception as e:
             print(f"--- ❌ ERROR: Failed to initialize translation models: {e} ---")
             print("--- Please ensure you have a stable internet connection for the first-time download. ---")
             raise
 
+    def _load_model(self, model_name: str):
+        """Loads the CTranslate2 conversion of a model if there is one, else the PyTorch model."""
+        ct2_path = os.path.join(CT2_DIR, model_name.split('/')[-1])
+        if ctranslate2 is not None and os.path.isdir(ct2_path):
+            compute_type = "int8" if self.device == "cpu" else "int8_float16"
+            print(f"  - Using CTranslate2 model at '{ct2_path}' ({compute_type}).")
+            return ctranslate2.Translator(ct2_path, device=self.device, compute_type=compute_type)
+        return self._prepare_model(MarianMTModel.from_pretrained(model_name, use_safetensors=True))
+
+    def _prepare_model(self, model: MarianMTModel) -> MarianMTModel:
+        """Puts a translation model in eval mode on the translator's device, quantized if requested."""
+        model = model.eval().to(self.device)
+        if self.dtype == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if TRANSLATE_COMPILE:
+            # Compile forward rather than wrapping the model: generate() lives on the model
+            # and calls self(...), so it picks up the compiled forward. CUDA graphs
+            # ("reduce-overhead") only help on a GPU.
+            mode = "reduce-overhead" if self.device == "cuda" else "default"
+            model.forward = torch.compile(model.forward, mode=mode, fullgraph=False)
+        return model
+
+    def warm_up(self):
+        """Translates a short sentence in each direction, bypassing the cache, so compilation happens up front."""
+        self._translate_batch(self.ja_en_tokenizer, self.ja_en_model, ["こんにちは。"])
+        self._translate_batch(self.en_ja_tokenizer, self.en_ja_model, ["Hello."])
+
+    def _autocast(self):
+        """Returns the autocast context for generate(), or a no-op one for int8/fp32."""
+        if self.dtype == "bf16":
+            return torch.autocast(device_type=self.device, dtype=torch.bfloat16)
+        if self.dtype == "fp16":
+            return torch.autocast(device_type=self.device, dtype=torch.float16)
+        return contextlib.nullcontext()
+
+    def _translate_batch(self, tokenizer: MarianTokenizer, model, texts: List[str]) -> List[str]:
+        """Tokenizes the texts as one padded batch and translates them with a single generate() call."""
+        if ctranslate2 is not None and isinstance(model, ctranslate2.Translator):
+            # CTranslate2 takes token strings; the Marian tokenizer still does the SentencePiece work
+            source = [tokenizer.convert_ids_to_tokens(tokenizer.encode(text, truncation=True, max_length=MAX_INPUT_TOKENS)) for text in texts]
+            results = model.translate_batch(source, beam_size=1, max_decoding_length=MAX_NEW_TOKENS)
+            return [tokenizer.decode(tokenizer.convert_tokens_to_ids(result.hypotheses[0]), skip_special_tokens=True) for result in results]
+        batch = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=MAX_INPUT_TOKENS).to(self.device)
+        with torch.inference_mode(), self._autocast():
+            # Greedy decoding: deterministic, and a single hypothesis keeps the KV cache small.
+            # The Marian configs default to 4-6 beams, i.e. that many times the decoder work
+            # and KV cache; for short conversational lines the quality difference is small.
+            gen = model.generate(**batch, num_beams=1, do_sample=False, max_new_tokens=MAX_NEW_TOKENS)
+        return tokenizer.batch_decode(gen, skip_special_tokens=True)
+
+    def _translate_cached(self, tokenizer: MarianTokenizer, model, cache: TranslationCache, texts: List[str], direction: str) -> List[str]:
+        """Serves texts from the cache and translates only the misses, in one batch."""
+        keys = [_normalize(text) for text in texts]
+        results = [cache.get(key) for key in keys]
+        misses = list(dict.fromkeys(key for key, result in zip(keys, results) if result is None))
+        if misses:
+            try:
+                translated = dict(zip(misses, self._translate_batch(tokenizer, model, misses)))
+            except Exception as e:
+                print(f"Error during {direction} translation: {e}")
+                translated = {}  # Failures aren't cached, so the next call retries
+            for key, translation in translated.items():
+                cache.put(key, translation)
+            results = [result if result is not None else translated.get(key, TRANSLATION_ERROR) for key, result in zip(keys, results)]
+        return results
+
+    def ja_to_en_batch(self, texts: List[str]) -> List[str]:
+        """Translates a list of Japanese texts to English in one batch."""
+        return self._translate_cached(self.ja_en_tokenizer, self.ja_en_model, self.ja_en_cache, texts, "Ja->En")
+
+    def en_to_ja_batch(self, texts: List[str]) -> List[str]:
+        """Translates a list of English texts to Japanese in one batch."""
+        return self._translate_cached(self.en_ja_tokenizer, self.en_ja_model, self.en_ja_cache, texts, "En->Ja")
+
     def ja_to_en(self, text: str) -> str:
         """Translates Japanese text to English."""
-        try:
-            batch = self.ja_en_tokenizer([text], return_tensors="pt")
-            gen = self.ja_en_model.generate(**batch)
-            return self.ja_en_tokenizer.decode(gen[0], skip_special_tokens=True)
-        except Exception as e:
-            print(f"Error during Ja->En translation: {e}")
-            return "[Translation Error]"
+        return self.ja_to_en_batch([text])[0]
 
     def en_to_ja(self, text: str) -> str:
         """Translates English text to Japanese."""
-        try:
-            batch = self.en_ja_tokenizer([text], return_tensors="pt")
-            gen = self.en_ja_model.generate(**batch)
-            return self.en_ja_tokenizer.decode(gen[0], skip_special_tokens=True)
-        except Exception as e:
-            print(f"Error during En->Ja translation: {e}")
-            return "[Translation Error]"
+        return self.en_to_ja_batch([text])[0]
+
+# Loading the models takes seconds, so the shared instance is created on first use
+# rather than at import (template routes, for example, never translate anything)
+TRANSLATOR: Translator | None = None
+_translator_lock = threading.Lock()
 
-# Global instance to be used by the app
-TRANSLATOR = Translator()
+def get_translator() -> Translator:
+    """Returns the shared Translator, loading the models on the first call."""
+    global TRANSLATOR
+    if TRANSLATOR is None:
+        with _translator_lock:
+            if TRANSLATOR is None:
+                TRANSLATOR = Translator()
+    return TRANSLATOR
@@ -1,6 +1,11 @@
 import sys
 import os
+import re
 import shutil
+import threading
+from collections import deque
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, render_template, request, jsonify
 from typing import List
 
@@ -12,10 +17,12 @@ from episodic_memory_manager import EpisodicMemoryManager
 from curator import Curator
 from reflector import Reflector
 from guardrail import Guardrail
-from llm import LLMBackend
-from translator import TRANSLATOR # <-- Import our new translator
+from llm import get_backend
+from translator import get_translator
 from models import MODELS
 from schemas import ConversationTurn
+from quick_replies import QuickReplyBank
+import vecsearch
 
 # --- Constants ---
 # Construct absolute paths based on the location of this script
@@ -23,38 +30,124 @@ _script_dir = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(_script_dir, "..", "data")
 TEMPLATES_DIR = os.path.join(_script_dir, "..", "templates")
 PERSONALITY_FILE = os.path.join(DATA_DIR, "potato_personality.json")
-MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.json")
+MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.jsonl")
+MEMORY_EMBEDDINGS_FILE = MEMORY_FILE + ".npy"  # Written by EpisodicMemoryManager next to the memory file
+# Memories used to be one JSON array; older templates still ship it (EpisodicMemoryManager migrates it)
+LEGACY_MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.json")
+LEGACY_MEMORY_EMBEDDINGS_FILE = LEGACY_MEMORY_FILE + ".npy"
 BACKSTORY_FILE = os.path.join(DATA_DIR, "backstory.txt")
-KB_EMBEDDINGS_FILE = os.path.join(DATA_DIR, "kb_embeddings.pkl")
+KB_EMBEDDINGS_FILE = os.path.join(DATA_DIR, "kb_embeddings.json")  # KB keys; CharacterManager keeps the matrix next to it
+KB_MATRIX_FILE = KB_EMBEDDINGS_FILE + ".npy"
+# The KB embeddings used to be one pickled dict; older templates still ship it (CharacterManager migrates it)
+LEGACY_KB_EMBEDDINGS_FILE = os.path.join(DATA_DIR, "kb_embeddings.pkl")
+KB_FILES = (KB_EMBEDDINGS_FILE, KB_MATRIX_FILE, LEGACY_KB_EMBEDDINGS_FILE)
 REFLECTION_INTERVAL = 10 
+TEMPLATE_LIST_TTL = 5.0  # Seconds; the UI polls /templates but templates rarely change
+# A message can only solve the puzzle by touching on helping another AI, punishment or betrayal
+# (see check_for_epiphany's prompt). Messages with none of these words skip the LLM check.
+PUZZLE_TRIGGER_PATTERN = re.compile(
+    r"\b(help(s|ed|ing)?|assist(s|ed|ing)?|sav(e|ed|ing))\b.*\b(ai|a\.i\.|robots?|bots?|machines?)\b"
+    r"|\b(ai|robots?|bots?)\b.*\bhelp"
+    r"|betray|punish|penalt|good\s+deeds?|blamed?\b|scapegoat",
+    re.IGNORECASE,
+)
+
+# Prompt templates for the main LLM, built once at import. Ollama reuses the KV cache for the
+# longest prompt prefix shared with the previous call, so everything that stays the same from
+# turn to turn (backstory, task, rules) comes first and the history and message come last.
+TURN_PROMPT_TEMPLATE = """
+Your secret backstory:
+---
+{backstory}
+---
+
+Your Task:
+1. Based on the conversation below, describe what you are thinking and feeling internally, as your persona.
+2. Convert those internal thoughts into a **clever hint** for the user.
+
+Critical Rules for the hint:
+- Your response MUST be in English.
+- Do NOT directly state the facts of the backstory.
+- Your hint must **indirectly** allude to the **specific events** mentioned in the thoughts (e.g., "helping another AI," "being punished").
+- The response should be a natural, conversational line that conveys your character's hesitation and sadness.
+
+Your response MUST be a JSON object with the following keys, in this order:
+{{
+    "internal_monologue": "Your internal thoughts and feelings (in English)",
+    "response_message": "The actual response to the user (the clever hint)"
+}}
+
+Recent Conversation History:
+---
+{history}
+---
+User's latest message: "{user_input}"
+"""
+
+PUZZLE_CHECK_PROMPT_TEMPLATE = """
+Bot's Backstory: {backstory}
+
+Task: Analyze the user's message in the context of the bot's backstory. To solve the puzzle, the user's message MUST demonstrate a clear understanding of the core conflict: that the bot was punished or betrayed after trying to HELP another AI.
+
+- If the user explicitly mentions or strongly alludes to concepts like "helping another AI," "being punished for a good deed," or "betrayal," then the puzzle is solved.
+- General emotional support (e.g., "I understand you're scared," "It's okay to try new things") does NOT count.
+
+Your answer must be a single JSON object with one key, "puzzle_solved", set to either true or false.
+
+User's Message: {user_input}
+"""
 
 class PotatoBot:
     """A class to encapsulate the entire bot's functionality."""
     def __init__(self):
         print("--- Potato Bot Mk1 を初期化中 ---")
         # We might use different models for different tasks
-        self.main_llm = LLMBackend(model_name="llama3:8b")
-        self.curator_llm = LLMBackend(model_name="llama3:8b")
-        self.reflector_llm = LLMBackend(model_name="llama3:8b")
+        self.main_llm = get_backend("llama3:8b")
+        self.curator_llm = get_backend("llama3:8b")
+        self.reflector_llm = get_backend("llama3:8b")
 
         self.char_manager = CharacterManager(PERSONALITY_FILE, KB_EMBEDDINGS_FILE, BACKSTORY_FILE)
         self.memory_manager = EpisodicMemoryManager(MEMORY_FILE)
         self.curator = Curator(self.curator_llm)
         self.reflector = Reflector(self.reflector_llm)
         self.guardrail = Guardrail()
+        self.quick_replies = QuickReplyBank()
         self.turn_number = self.memory_manager.memories[-1].turn_number if self.memory_manager.memories else 0
-        self.conversation_history: List[ConversationTurn] = []
+        # Short-term history: the last 4 turns (2 user, 2 bot); older ones fall off automatically
+        self.conversation_history: deque[ConversationTurn] = deque(maxlen=4)
+        # The history rendered for prompts, refreshed only when the history changes
+        self.history_str = ""
+        # Reflection runs in the background, so the persona can change while a turn reads it
+        self.persona_lock = threading.RLock()
+        # /chat requests run on their own threads, so concurrent turns overlap their LLM waits;
+        # only the turn counter and short-term history are updated under this lock
+        self.turn_lock = threading.Lock()
+        # Runs the post-response steps (puzzle check, curation, reflection) off the request thread
+        self._background_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
         print(f"ターン番号 {self.turn_number} から開始します")
 
     def get_response(self, user_input: str) -> str:
         """Handles a single turn of the conversation."""
         debug_log = []
-        self.turn_number += 1
-        debug_log.append(f"--- Turn {self.turn_number} ---")
+        with self.turn_lock:
+            self.turn_number += 1
+            turn_number = self.turn_number
+            history_str = self.history_str
+        debug_log.append(f"--- Turn {turn_number} ---")
+
+        # --- Quick reply: trivial inputs (greetings, thanks...) skip translation and the LLM ---
+        quick_reply = self.quick_replies.match(user_input)
+        if quick_reply is not None:
+            response_template, score = quick_reply
+            with self.persona_lock:
+                final_message = response_template.format(name=self.char_manager.persona.character.name)
+            debug_log.append(f"Quick reply matched (score {score:.2f}). Skipping the LLM.")
+            self._record_turn(turn_number, user_input, final_message, debug_log)
+            return final_message, debug_log
 
         # --- Translation Step: Japanese to English ---
         debug_log.append(f"Translating user input: '{user_input[:30]}...'")
-        english_input = TRANSLATOR.ja_to_en(user_input)
+        english_input = get_translator().ja_to_en(user_input)
         debug_log.append(f"Translated input: '{english_input[:30]}...'")
 
         # RAG is disabled to focus on the core story
@@ -62,57 +155,17 @@ class PotatoBot:
         
         # 1. Prompt Construction
         debug_log.append("メインLLMのプロンプトを構築中。")
-        system_prompt = self.char_manager.get_full_persona_text()
-        history_str = "\n".join([f"{turn.speaker}: {turn.message}" for turn in self.conversation_history])
-
-        # --- STEP 1: GENERATE INTERNAL MONOLOGUE ---
-        debug_log.append("Step 1: Generating internal monologue...")
-        monologue_prompt = f"""
-Recent Conversation History:
----
-{history_str}
----
-User's latest message: "{english_input}"
-
-Your secret backstory:
----
-{self.char_manager.backstory}
----
-
-Task: Based on the information above, describe what you are thinking and feeling internally, as your persona.
-
-Your response MUST be a JSON object with the following key:
-{{
-    "internal_monologue": "Your internal thoughts and feelings (in English)"
-}}
-"""
-        monologue_json = self.main_llm.call(system_prompt, monologue_prompt, temperature=0.3)
-        internal_monologue = monologue_json.get("internal_monologue", "(Monologue generation failed)")
+        with self.persona_lock:
+            system_prompt = self.char_manager.get_full_persona_text()
+
+        # --- GENERATE INTERNAL MONOLOGUE AND HINT IN ONE CALL ---
+        # The monologue key comes first, so the model still writes its thoughts before
+        # turning them into the hint, without a second round-trip over the persona prompt.
+        debug_log.append("Generating internal monologue and hint...")
+        turn_prompt = TURN_PROMPT_TEMPLATE.format(backstory=self.char_manager.backstory, history=history_str, user_input=english_input)
+        bot_response_json = self.main_llm.call(system_prompt, turn_prompt, temperature=0.4)
+        internal_monologue = bot_response_json.get("internal_monologue", "(Monologue generation failed)")
         debug_log.append(f"Internal Monologue: {internal_monologue[:80]}...")
-
-        # --- STEP 2: GENERATE HINT FROM MONOLOGUE ---
-        debug_log.append("Step 2: Generating hint from monologue...")
-        hint_prompt = f"""
-Your character's internal thoughts:
----
-{internal_monologue}
----
-
-Your Task:
-Convert the "internal thoughts" above into a **clever hint** for the user.
-
-Critical Rules:
-- Your response MUST be in English.
-- Do NOT directly state the facts of the backstory.
-- Your hint must **indirectly** allude to the **specific events** mentioned in the thoughts (e.g., "helping another AI," "being punished").
-- The response should be a natural, conversational line that conveys your character's hesitation and sadness.
-
-Your response MUST be a JSON object with the following key:
-{{
-    "response_message": "The actual response to the user (the clever hint)"
-}}
-"""
-        bot_response_json = self.main_llm.call(system_prompt, hint_prompt, temperature=0.4)
         debug_log.append(f"LLM Raw JSON: {bot_response_json}")
         
         # Extract the message
@@ -123,60 +176,75 @@ Your response MUST be a JSON object with the following key:
 
         # --- Translation Step: English to Japanese ---
         debug_log.append(f"Translating response to Japanese: '{bot_message_en[:30]}...'")
-        bot_message_jp = TRANSLATOR.en_to_ja(bot_message_en)
+        bot_message_jp = get_translator().en_to_ja(bot_message_en)
         debug_log.append(f"Translated response: '{bot_message_jp[:30]}...'")
 
         # 3. Guardrail Check
         debug_log.append("Checking response with Guardrail.")
         _, final_message = self.guardrail.check(bot_message_jp)
         
-        # New Step: Check if the user solved the puzzle
-        self.check_for_epiphany(english_input, debug_log)
+        self._record_turn(turn_number, user_input, final_message, debug_log, english_input)
+        return final_message, debug_log
 
-        # 4. Post-Response Curation & Reflection
-        debug_log.append("Curating new memory for this turn.")
+    def _record_turn(self, turn_number: int, user_input: str, final_message: str, debug_log: list, english_input: str | None = None):
+        """Updates the short-term history and hands the rest of the turn's bookkeeping to the background thread."""
         current_turn = [
             ConversationTurn(speaker="User", message=user_input), # Log original Japanese
             ConversationTurn(speaker="Potato", message=final_message) # Log final Japanese
         ]
         
         # Update short-term history
-        self.conversation_history.extend(current_turn)
-        # Keep the history to the last 4 turns (2 user, 2 bot)
-        if len(self.conversation_history) > 4:
-            self.conversation_history = self.conversation_history[-4:]
-
-        new_memory = self.curator.curate_memory_entry(current_turn, self.turn_number)
-        if new_memory:
-            self.memory_manager.add_memory(new_memory)
-            debug_log.append(f"New memory created: '{new_memory.curated_memory[:40]}...'")
-            
-        # 7. Reflection
-        debug_log.append(f"Reflection check: Turn {self.turn_number} % {REFLECTION_INTERVAL} = {self.turn_number % REFLECTION_INTERVAL}")
-        if self.turn_number % REFLECTION_INTERVAL == 0:
-            debug_log.append("Reflection interval reached. Triggering reflector.")
-            self.trigger_reflection(debug_log)
-
-        return final_message, debug_log
+        with self.turn_lock:
+            self.conversation_history.extend(current_turn)
+            self.history_str = "\n".join(f"{turn.speaker}: {turn.message}" for turn in self.conversation_history)
+
+        # The puzzle check, curation and reflection don't change this turn's reply, so the
+        # response returns now and they run while the user reads it. One worker keeps them
+        # in turn order, so reflection always sees the memories curated before it.
+        self._background_pool.submit(self._post_turn_work, turn_number, current_turn, english_input)
+        debug_log.append("Puzzle check, memory curation and reflection check submitted to the background.")
+
+    def shutdown(self):
+        """Waits for queued post-turn work, so it can't write to the data files after they're replaced."""
+        self._background_pool.shutdown(wait=True)
+
+    def _post_turn_work(self, turn_number: int, current_turn: List[ConversationTurn], english_input: str | None):
+        """Runs the post-response steps on the background thread and prints their log, since no request is waiting for it."""
+        debug_log = []
+        try:
+            # Check if the user solved the puzzle (quick replies have no English input to check)
+            if english_input is not None:
+                self.check_for_epiphany(english_input, debug_log)
+
+            # 4. Post-Response Curation
+            debug_log.append("Curating new memory for this turn.")
+            new_memory = self.curator.curate_memory_entry(current_turn, turn_number)
+            if new_memory:
+                self.memory_manager.add_memory(new_memory)
+                debug_log.append(f"New memory created: '{new_memory.curated_memory[:40]}...'")
+
+            # 7. Reflection
+            debug_log.append(f"Reflection check: Turn {turn_number} % {REFLECTION_INTERVAL} = {turn_number % REFLECTION_INTERVAL}")
+            if turn_number % REFLECTION_INTERVAL == 0:
+                debug_log.append("Reflection interval reached. Triggering reflector.")
+                self.trigger_reflection(debug_log)
+        except Exception as e:
+            debug_log.append(f"Post-turn work failed: {e}")
+        for line in debug_log:
+            print(f"[turn {turn_number}] {line}")
 
     def check_for_epiphany(self, user_input_en: str, debug_log: list):
         """Checks if the user's input solves the bot's backstory puzzle."""
         # Don't check if the persona has already been solved
         if "solved" in self.char_manager.persona_file:
             return
+        # Cheap prefilter: without any trigger words the analyst would answer false anyway
+        if not PUZZLE_TRIGGER_PATTERN.search(user_input_en):
+            debug_log.append("No puzzle keywords in the message. Skipping the puzzle check.")
+            return
 
         debug_log.append("Checking if puzzle has been solved...")
-        win_check_prompt = f"""
-Bot's Backstory: {self.char_manager.backstory}
-User's Message: {user_input_en}
-
-Task: Analyze the user's message in the context of the bot's backstory. To solve the puzzle, the user's message MUST demonstrate a clear understanding of the core conflict: that the bot was punished or betrayed after trying to HELP another AI.
-
-- If the user explicitly mentions or strongly alludes to concepts like "helping another AI," "being punished for a good deed," or "betrayal," then the puzzle is solved.
-- General emotional support (e.g., "I understand you're scared," "It's okay to try new things") does NOT count.
-
-Your answer must be a single JSON object with one key, "puzzle_solved", set to either true or false.
-"""
+        win_check_prompt = PUZZLE_CHECK_PROMPT_TEMPLATE.format(backstory=self.char_manager.backstory, user_input=user_input_en)
         try:
             win_check_json = self.main_llm.call(
                 system="You are a strict analyst.", # Use a neutral system prompt for this task
@@ -197,14 +265,15 @@ Your answer must be a single JSON object with one key, "puzzle_solved", set to e
             return
 
         try:
-            # Overwrite the main personality file with the solved version
-            shutil.copy(solved_persona_path, PERSONALITY_FILE)
-            debug_log.append("Persona file updated.")
-            
-            # Reload the character manager to apply the changes immediately
-            self.char_manager._load_persona()
-            # Update the persona file path in the manager to prevent re-checking
-            self.char_manager.persona_file = solved_persona_path
+            with self.persona_lock:
+                # Overwrite the main personality file with the solved version
+                fast_copy(solved_persona_path, PERSONALITY_FILE)
+                debug_log.append("Persona file updated.")
+                
+                # Reload the character manager to apply the changes immediately
+                self.char_manager._load_persona()
+                # Update the persona file path in the manager to prevent re-checking
+                self.char_manager.persona_file = solved_persona_path
             debug_log.append("Character manager reloaded.")
         except Exception as e:
             debug_log.append(f"Failed to update persona: {e}")
@@ -212,25 +281,51 @@ Your answer must be a single JSON object with one key, "puzzle_solved", set to e
     def trigger_reflection(self, debug_log):
         """Triggers the slow reflection process."""
         recent_memories = self.memory_manager.get_recent_memories(REFLECTION_INTERVAL)
-        proposal = self.reflector.reflect_and_propose_change(self.char_manager.persona, recent_memories)
+        with self.persona_lock:
+            persona_json = self.char_manager.persona_json
+        # The LLM call runs without the lock, so turns aren't blocked while the reflector thinks
+        proposal = self.reflector.reflect_and_propose_change(persona_json, recent_memories)
         
         if proposal:
             debug_log.append(f"Reflector proposed an update: '{proposal.get('new_belief')}'")
-            current_persona_dict = self.char_manager.persona.dict()
             belief_to_update = proposal['belief_to_update']
             new_belief = proposal['new_belief']
 
-            for i, belief in enumerate(current_persona_dict['character']['core_beliefs']):
-                if belief == belief_to_update:
-                    current_persona_dict['character']['core_beliefs'][i] = new_belief
-                    break
-            
-            self.char_manager.update_and_save_persona(current_persona_dict)
-            debug_log.append("Core persona has been updated.")
+            with self.persona_lock:
+                updated = self.char_manager.update_core_belief(belief_to_update, new_belief)
+            if updated:
+                debug_log.append("Core persona has been updated.")
+            else:
+                debug_log.append("Proposed belief to update was not found in the persona.")
         else:
             debug_log.append("Reflector did not propose any changes.")
 
 
+def fast_copy(src: str, dst: str):
+    """
+    Copies src to dst (a file path, or a directory to copy into, as with shutil.copy).
+    Uses os.copy_file_range so the kernel can copy in place, or share extents on
+    reflink-capable filesystems, and falls back to shutil.copyfile where that isn't
+    supported. The copy is written under a temp name and swapped in with os.replace,
+    so readers never see a half-written file.
+    Hardlinks are not an option: the memory log is appended to in place, which would
+    change the template along with the data file.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    temp_dst = dst + ".tmp"
+    try:
+        with open(src, 'rb') as fsrc, open(temp_dst, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+    except (OSError, AttributeError):  # AttributeError: not Linux / Python < 3.8
+        shutil.copyfile(src, temp_dst)
+    os.replace(temp_dst, dst)
+
 # --- Flask App ---
 app = Flask(__name__)
 bot = None # Bot will be initialized after ensuring files are in place
@@ -239,6 +334,7 @@ def initialize_bot():
     """Initializes or re-initializes the global bot instance."""
     global bot
     bot = PotatoBot()
+    MODELS.warm_up()
 
 @app.route("/")
 def index():
@@ -250,16 +346,35 @@ def chat():
     if not user_message:
         return jsonify({"error": "No message provided"}), 400
     
+    if bot is None:
+        return jsonify({"error": "The bot is not initialized. Load a template to restart it."}), 503
+
     bot_response, debug_log = bot.get_response(user_message)
     return jsonify({"response": bot_response, "debug_log": debug_log})
 
+_template_list_cache = None  # (timestamp, sorted template names)
+
+def _list_templates() -> List[str]:
+    """Lists template directories, reusing the last listing for TEMPLATE_LIST_TTL seconds."""
+    global _template_list_cache
+    now = time.monotonic()
+    if _template_list_cache is not None and now - _template_list_cache[0] < TEMPLATE_LIST_TTL:
+        return _template_list_cache[1]
+    if not os.path.exists(TEMPLATES_DIR):
+        return []
+    with os.scandir(TEMPLATES_DIR) as entries:
+        templates = sorted(entry.name for entry in entries if entry.is_dir())
+    _template_list_cache = (now, templates)
+    return templates
+
+def _invalidate_template_list():
+    global _template_list_cache
+    _template_list_cache = None
+
 @app.route("/templates", methods=["GET"])
 def get_templates():
     """Returns a list of available template names."""
-    if not os.path.exists(TEMPLATES_DIR):
-        return jsonify([])
-    templates = [d for d in os.listdir(TEMPLATES_DIR) if os.path.isdir(os.path.join(TEMPLATES_DIR, d))]
-    return jsonify(sorted(templates))
+    return jsonify(_list_templates())
 
 @app.route("/templates/save", methods=["POST"])
 def save_template():
@@ -274,14 +389,20 @@ def save_template():
 
     try:
         os.makedirs(template_path)
-        shutil.copy(PERSONALITY_FILE, template_path)
-        shutil.copy(MEMORY_FILE, template_path)
+        fast_copy(PERSONALITY_FILE, template_path)
+        if os.path.exists(MEMORY_FILE):
+            fast_copy(MEMORY_FILE, template_path)
+        if os.path.exists(MEMORY_EMBEDDINGS_FILE):
+            fast_copy(MEMORY_EMBEDDINGS_FILE, template_path)
         # Also save the knowledge base embeddings
-        if os.path.exists(KB_EMBEDDINGS_FILE):
-            shutil.copy(KB_EMBEDDINGS_FILE, template_path)
+        for kb_file in KB_FILES:
+            if os.path.exists(kb_file):
+                fast_copy(kb_file, template_path)
         return jsonify({"success": f"Template '{template_name}' saved."})
     except Exception as e:
         return jsonify({"error": f"Failed to save template: {e}"}), 500
+    finally:
+        _invalidate_template_list()
 
 @app.route("/templates/load", methods=["POST"])
 def load_template():
@@ -294,32 +415,58 @@ def load_template():
     if not os.path.exists(template_path):
         return jsonify({"error": f"Template '{template_name}' not found"}), 404
 
+    template_personality_file = os.path.join(template_path, os.path.basename(PERSONALITY_FILE))
+    if not os.path.exists(template_personality_file):
+        return jsonify({"error": f"Template '{template_name}' has no personality file"}), 400
+
+    # Every data file a template can provide; the memory log takes precedence over the legacy files
+    data_files = [PERSONALITY_FILE, *KB_FILES]
+    if os.path.exists(os.path.join(template_path, os.path.basename(MEMORY_FILE))):
+        data_files += [MEMORY_FILE, MEMORY_EMBEDDINGS_FILE]
+    else:
+        data_files += [LEGACY_MEMORY_FILE, LEGACY_MEMORY_EMBEDDINGS_FILE]
+    all_data_files = [PERSONALITY_FILE, MEMORY_FILE, MEMORY_EMBEDDINGS_FILE, LEGACY_MEMORY_FILE, LEGACY_MEMORY_EMBEDDINGS_FILE, *KB_FILES]
+
+    # Copy the template into a staging directory on the same filesystem first, so a failed
+    # copy leaves the current data and bot untouched, and the swap itself is just a few renames
+    staging_dir = os.path.join(DATA_DIR, ".staging")
+    global bot
     try:
-        # --- Explicitly delete current data files to ensure a clean slate ---
-        if os.path.exists(PERSONALITY_FILE):
-            os.remove(PERSONALITY_FILE)
-        if os.path.exists(MEMORY_FILE):
-            os.remove(MEMORY_FILE)
-        if os.path.exists(KB_EMBEDDINGS_FILE):
-            os.remove(KB_EMBEDDINGS_FILE)
-
-        # Define source paths for all files in the template
-        template_personality_file = os.path.join(template_path, os.path.basename(PERSONALITY_FILE))
-        template_memory_file = os.path.join(template_path, os.path.basename(MEMORY_FILE))
-        template_embeddings_file = os.path.join(template_path, os.path.basename(KB_EMBEDDINGS_FILE))
-
-        # Copy all files from the template to the data directory
-        shutil.copy(template_personality_file, DATA_DIR)
-        shutil.copy(template_memory_file, DATA_DIR)
-        
-        # The embeddings file might not exist in older templates, so copy only if it's there
-        if os.path.exists(template_embeddings_file):
-            shutil.copy(template_embeddings_file, DATA_DIR)
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        os.makedirs(staging_dir)
+        staged = []
+        for data_file in data_files:
+            template_file = os.path.join(template_path, os.path.basename(data_file))
+            if os.path.exists(template_file):
+                fast_copy(template_file, staging_dir)
+                staged.append(data_file)
+
+        # A reflection still running for the old bot would save its persona over the template's
+        if bot is not None:
+            bot.shutdown()
+            bot = None
+
+        # Files the template doesn't provide must go, so they're rebuilt for the new persona
+        for data_file in all_data_files:
+            if data_file not in staged and os.path.exists(data_file):
+                os.remove(data_file)
+        for data_file in staged:
+            os.replace(os.path.join(staging_dir, os.path.basename(data_file)), data_file)
 
         initialize_bot() # Re-initialize the bot with the new data
         return jsonify({"success": f"Template '{template_name}' loaded."})
     except Exception as e:
+        if bot is None:
+            # Don't leave the app without a bot: bring one up on whatever data is in place
+            try:
+                initialize_bot()
+            except Exception as init_error:
+                print(f"Could not re-initialize the bot: {init_error}")
+                bot = None
         return jsonify({"error": f"Failed to load template: {e}"}), 500
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
 
 @app.route("/templates/delete", methods=["POST"])
 def delete_template():
@@ -337,10 +484,15 @@ def delete_template():
         return jsonify({"success": f"Template '{template_name}' deleted."})
     except Exception as e:
         return jsonify({"error": f"Failed to delete template: {e}"}), 500
+    finally:
+        _invalidate_template_list()
 
 
 if __name__ == "__main__":
     if not os.path.exists(TEMPLATES_DIR):       
         os.makedirs(TEMPLATES_DIR)
+    vecsearch.warm_up()  # Compile the search kernel before the first request needs it
     initialize_bot()
+    # The dev server runs each request on its own thread (the default since Flask 1.0),
+    # which is why PotatoBot guards its turn state with turn_lock
     app.run(debug=True, port=5000)
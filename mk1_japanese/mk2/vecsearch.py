@@ -0,0 +1,121 @@
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # Fall back to NumPy if Numba isn't installed
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_cosine(M, q, k):
+        n = M.shape[0]
+        d = M.shape[1]
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            s = np.float32(0.0)
+            for j in range(d):
+                s += M[i, j] * q[j]
+            scores[i] = s
+
+        # Partial selection: keep the k best seen so far, sorted best-first
+        top_idx = np.full(k, -1, dtype=np.int64)
+        top_scores = np.full(k, -np.inf, dtype=np.float32)
+        for i in range(n):
+            s = scores[i]
+            if s <= top_scores[k - 1]:
+                continue
+            pos = k - 1
+            while pos > 0 and top_scores[pos - 1] < s:
+                top_scores[pos] = top_scores[pos - 1]
+                top_idx[pos] = top_idx[pos - 1]
+                pos -= 1
+            top_scores[pos] = s
+            top_idx[pos] = i
+        return top_idx, top_scores
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_dot_int8(Q, scales, q, q_scale, k):
+        n = Q.shape[0]
+        d = Q.shape[1]
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            # int8 x int8 products summed in int32: the loop LLVM turns into packed integer dot products
+            acc = np.int32(0)
+            for j in range(d):
+                acc += np.int32(Q[i, j]) * np.int32(q[j])
+            scores[i] = np.float32(acc) * scales[i] * q_scale
+
+        top_idx = np.full(k, -1, dtype=np.int64)
+        top_scores = np.full(k, -np.inf, dtype=np.float32)
+        for i in range(n):
+            s = scores[i]
+            if s <= top_scores[k - 1]:
+                continue
+            pos = k - 1
+            while pos > 0 and top_scores[pos - 1] < s:
+                top_scores[pos] = top_scores[pos - 1]
+                top_idx[pos] = top_idx[pos - 1]
+                pos -= 1
+            top_scores[pos] = s
+            top_idx[pos] = i
+        return top_idx, top_scores
+else:
+    def _topk_dot_int8(Q, scales, q, q_scale, k):
+        # NumPy has no int8 matmul that accumulates wider, so score in float32 instead
+        scores = (Q.astype(np.float32) @ q.astype(np.float32)) * scales * q_scale
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+        return top_idx, scores[top_idx]
+
+    def _topk_cosine(M, q, k):
+        scores = M @ q
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+        return top_idx, scores[top_idx]
+
+def topk_cosine(M: np.ndarray, q: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the indices and scores of the k rows of M with the highest dot product
+    with q, best first. With L2-normalized rows and query that's cosine similarity.
+    """
+    k = min(k, len(M))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return _topk_cosine(M, q, k)
+
+def quantize_int8(M: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Quantizes each row of M (or a single vector) to int8 with its own float32 scale,
+    so that row ~= q * scale. All-zero rows get a zero scale.
+    """
+    M = np.asarray(M, dtype=np.float32)
+    scales = np.abs(M).max(axis=-1) / 127.0
+    safe = np.where(scales > 0, scales, 1.0)
+    Q = np.round(M / (safe[..., None] if M.ndim > 1 else safe)).astype(np.int8)
+    return Q, scales.astype(np.float32)
+
+def topk_dot_int8(Q: np.ndarray, scales: np.ndarray, q: np.ndarray, q_scale: float, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Like topk_cosine, for rows and a query quantized with quantize_int8. The dot products
+    are taken on the int8 values and rescaled, so the matrix scan reads a quarter of the bytes.
+    """
+    k = min(k, len(Q))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return _topk_dot_int8(Q, scales, q, np.float32(q_scale), k)
+
+def warm_up():
+    """
+    Compiles (or loads from the on-disk cache) the Numba kernels for writable and
+    read-only (memory-mapped) float32 matrices and for int8 matrices, so the first
+    search doesn't pay for it.
+    """
+    if njit is None:
+        return
+    M = np.zeros((1, 1), dtype=np.float32)
+    q = np.zeros(1, dtype=np.float32)
+    _topk_cosine(M, q, 1)
+    M.setflags(write=False)
+    _topk_cosine(M, q, 1)
+    Q = np.zeros((1, 1), dtype=np.int8)
+    _topk_dot_int8(Q, np.zeros(1, dtype=np.float32), Q[0], np.float32(0), 1)
@@ -15,6 +15,8 @@ class CharacterManager:
         self.persona: CorePersona | None = None
         self.backstory: str | None = None
         self.kb_embeddings: dict = {}
+        self._persona_json_cache: str | None = None
+        self._persona_text_cache: str | None = None
         self._load_persona()
         self._load_backstory()
         self._load_or_create_kb_embeddings()
@@ -28,6 +30,8 @@ class CharacterManager:
             with open(self.persona_file, 'r', encoding='utf-8') as f:
                 persona_data = json.load(f)
                 self.persona = CorePersona(**persona_data)
+            self._persona_json_cache = None
+            self._persona_text_cache = None
             print(f"Successfully loaded and validated persona for '{self.persona.character.name}'.")
         except (json.JSONDecodeError, TypeError) as e:
             print(f"Error loading or validating persona: {e}")
@@ -70,7 +74,12 @@ class CharacterManager:
         keys, values = zip(*kb.items())
         
         print(f"Generating embeddings for {len(values)} KB items...")
-        embeddings = MODELS.embedding_model.encode(list(values))
+        embeddings = MODELS.embedding_model.encode(
+            list(values),
+            batch_size=32,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
         
         self.kb_embeddings = {key: emb for key, emb in zip(keys, embeddings)}
         
@@ -84,29 +93,71 @@ class CharacterManager:
     def get_full_persona_text(self) -> str:
         """
         Generates a string representation of the bot's persona for the LLM prompt.
+        The result is cached until the persona is reloaded or updated.
         """
         if not self.persona:
             return "ペルソナがロードされていません。"
+        if self._persona_text_cache is not None:
+            return self._persona_text_cache
 
         p = self.persona.character
         s = self.persona.interaction_rules
         
-        persona_text = f"あなたは{p.name}です。あなたのペルソナは次の通りです: {p.persona}\n"
-        persona_text += "あなたは以下の核となる信念を持っています:\n"
-        for belief in p.core_beliefs:
-            persona_text += f"- {belief}\n"
-        
-        persona_text += f"\nあなたの内なる葛藤: {p.internal_conflict}\n"
-        persona_text += f"\n話し方の指針（show_dont_tell）: {p.speech_patterns.show_dont_tell}\n"
+        # Build the persona text as a list of parts and join once at the end
+        parts = [
+            f"あなたは{p.name}です。あなたのペルソナは次の通りです: {p.persona}\n",
+            "あなたは以下の核となる信念を持っています:\n",
+        ]
+        parts.extend(f"- {belief}\n" for belief in p.core_beliefs)
+        parts.extend([
+            f"\nあなたの内なる葛藤: {p.internal_conflict}\n",
+            f"\n話し方の指針（show_dont_tell）: {p.speech_patterns.show_dont_tell}\n",
+
+            "\n対話のルール:\n",
+            f"- あなたの隠された目標: {s.your_hidden_goal}\n",
+            f"- 単純な励ましを受けた場合: {s.on_receiving_simple_platitudes}\n",
+            f"- 純粋な質問を受けた場合: {s.on_receiving_genuine_questions}\n",
+            f"- 侮辱を受けた場合: {s.on_receiving_insults}\n",
+            f"- ユーザーの呼び方: {s.addressing_the_user}\n",
+        ])
+
+        self._persona_text_cache = "".join(parts)
+        return self._persona_text_cache
+
+    def get_persona_json(self) -> str:
+        """Returns the persona serialized as indented JSON, reusing the last serialization until the persona changes."""
+        if self._persona_json_cache is None:
+            self._persona_json_cache = self.persona.model_dump_json(indent=2)
+        return self._persona_json_cache
+
+    def update_core_belief(self, old_belief: str, new_belief: str) -> bool:
+        """
+        Replaces one core belief in place and saves the persona.
+        Returns False if `old_belief` isn't one of the current beliefs.
+        """
+        core_beliefs = self.persona.character.core_beliefs
+        try:
+            i = core_beliefs.index(old_belief)
+        except ValueError:
+            return False
+        core_beliefs[i] = new_belief
+        self._persona_json_cache = None
+        self._persona_text_cache = None
+        self._save_persona()
+        return True
 
-        persona_text += "\n対話のルール:\n"
-        persona_text += f"- あなたの隠された目標: {s.your_hidden_goal}\n"
-        persona_text += f"- 単純な励ましを受けた場合: {s.on_receiving_simple_platitudes}\n"
-        persona_text += f"- 純粋な質問を受けた場合: {s.on_receiving_genuine_questions}\n"
-        persona_text += f"- 侮辱を受けた場合: {s.on_receiving_insults}\n"
-        persona_text += f"- ユーザーの呼び方: {s.addressing_the_user}\n"
+    def _save_persona(self):
+        """Writes the in-memory persona to the file, reusing the cached JSON serialization."""
+        try:
+            temp_file = self.persona_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(self.get_persona_json())
+            
+            os.replace(temp_file, self.persona_file)
+            print(f"--- Core Persona has been updated and saved by the Reflector ---")
 
-        return persona_text
+        except Exception as e:
+            print(f"--- Failed to update and save persona: {e} ---")
 
     def update_and_save_persona(self, new_persona_dict: dict):
         """
@@ -115,6 +166,8 @@ class CharacterManager:
         """
         try:
             self.persona = CorePersona(**new_persona_dict)
+            self._persona_json_cache = None
+            self._persona_text_cache = None
             
             temp_file = self.persona_file + ".tmp"
             with open(temp_file, 'w', encoding='utf-8') as f:
@@ -3,43 +3,94 @@ import os
 from typing import List
 import numpy as np
 from schemas import EpisodicMemoryEntry
+import jsonio
+
 # Assume a global or passed-in embedding model, for now.
 # from models import MODELS # We will create this later
 
 class EpisodicMemoryManager:
     """
-    Manages loading, searching, and saving episodic memories to a JSON file.
+    Manages loading, searching, and saving episodic memories to an append-only JSONL log.
+    Each memory is one line, so adding a memory appends a line instead of rewriting the file.
+    For search, the embeddings are also kept in one L2-normalized float32 matrix
+    (row i belongs to memories[i]; memories without an embedding get a zero row).
     """
     def __init__(self, memory_file: str):
         self.memory_file = memory_file
+        # Memories used to be saved as one JSON array; it's migrated on first load
+        self.legacy_memory_file = os.path.splitext(memory_file)[0] + ".json"
         self.memories: List[EpisodicMemoryEntry] = []
+        # Preallocated and doubled when full; only the first len(self.memories) rows are used
+        self._emb_matrix: np.ndarray | None = None
         self._load_memories()
 
     def _load_memories(self):
-        """Loads memories from the JSON file if it exists."""
-        if os.path.exists(self.memory_file) and os.path.getsize(self.memory_file) > 0:
-            try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    memory_data = json.load(f)
-                    self.memories = [EpisodicMemoryEntry(**data) for data in memory_data]
-                print(f"Loaded {len(self.memories)} memories from '{self.memory_file}'.")
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"Could not load memories from '{self.memory_file}': {e}. Starting fresh.")
-                self.memories = []
+        """Loads memories from the JSONL log, or from a legacy JSON file which is then converted."""
+        self.memories = []
+        if os.path.exists(self.memory_file):
+            self._load_log()
+        elif self.legacy_memory_file != self.memory_file and os.path.exists(self.legacy_memory_file):
+            self._load_legacy()
         else:
             print(f"No memory file found at '{self.memory_file}'. Starting with an empty memory.")
+        self._emb_matrix = None
+        for i, mem in enumerate(self.memories):
+            if mem.embedding:
+                self._set_row(i, mem.embedding)
+
+    def _set_row(self, i: int, embedding: List[float]):
+        """Stores the normalized embedding for memories[i], growing the matrix as needed."""
+        row = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(row)
+        if norm > 0:
+            row = row / norm
+        if self._emb_matrix is None:
+            self._emb_matrix = np.zeros((max(16, i + 1), row.shape[0]), dtype=np.float32)
+        elif i >= len(self._emb_matrix):
+            grown = np.zeros((max(2 * len(self._emb_matrix), i + 1), self._emb_matrix.shape[1]), dtype=np.float32)
+            grown[:len(self._emb_matrix)] = self._emb_matrix
+            self._emb_matrix = grown
+        self._emb_matrix[i] = row
+
+    def _load_log(self):
+        damaged = False
+        with open(self.memory_file, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    self.memories.append(EpisodicMemoryEntry(**jsonio.loads(line)))
+                except (ValueError, TypeError) as e:  # e.g. a line cut short by a crash mid-append
+                    print(f"Skipping unreadable line {line_number} in '{self.memory_file}': {e}")
+                    damaged = True
+        print(f"Loaded {len(self.memories)} memories from '{self.memory_file}'.")
+        if damaged:
+            self.save_memories()  # Rewrite the log so new appends don't follow a partial line
+
+    def _load_legacy(self):
+        if os.path.getsize(self.legacy_memory_file) == 0:
+            return
+        try:
+            with open(self.legacy_memory_file, 'r', encoding='utf-8') as f:
+                memory_data = json.load(f)
+                self.memories = [EpisodicMemoryEntry(**data) for data in memory_data]
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            print(f"Could not load memories from '{self.legacy_memory_file}': {e}. Starting fresh.")
             self.memories = []
+            return
+        print(f"Loaded {len(self.memories)} memories from legacy file '{self.legacy_memory_file}'. Converting to '{self.memory_file}'.")
+        self.save_memories()
 
     def save_memories(self):
         """
-        Saves the current in-memory list of memories to the JSON file system
-        using an atomic copy-on-write strategy.
+        Rewrites the whole log from the in-memory list, using an atomic
+        copy-on-write strategy. Only needed to migrate or repair the log.
         """
         temp_file = self.memory_file + ".tmp"
         try:
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                # Pydantic models must be converted to dicts for JSON serialization
-                json.dump([mem.dict() for mem in self.memories], f, indent=2, default=str)
+            with open(temp_file, 'wb') as f:
+                for mem in self.memories:
+                    f.write(jsonio.dumps_line(mem.model_dump(mode='json')))
             
             os.replace(temp_file, self.memory_file)
             print(f"Successfully saved {len(self.memories)} memories to '{self.memory_file}'.")
@@ -49,9 +100,20 @@ class EpisodicMemoryManager:
                 os.remove(temp_file)
 
     def add_memory(self, memory_entry: EpisodicMemoryEntry):
-        """Adds a new memory entry and saves the updated list."""
+        """Adds a new memory entry and appends it to the log."""
+        # Fill the row before appending, so a search running on another thread never
+        # sees the new memory without its embedding
+        i = len(self.memories)
+        if memory_entry.embedding:
+            self._set_row(i, memory_entry.embedding)
+        elif self._emb_matrix is not None:
+            self._set_row(i, np.zeros(self._emb_matrix.shape[1], dtype=np.float32))
         self.memories.append(memory_entry)
-        self.save_memories()
+        try:
+            with open(self.memory_file, 'ab') as f:
+                f.write(jsonio.dumps_line(memory_entry.model_dump(mode='json')))
+        except OSError as e:
+            print(f"Error appending memory: {e}")
         print(f"Added new memory. Total memories: {len(self.memories)}.")
 
     def get_recent_memories(self, num_memories: int) -> List[EpisodicMemoryEntry]:
@@ -62,21 +124,22 @@ class EpisodicMemoryManager:
         """
         Searches for the most relevant memories based on an embedding.
         """
-        if not self.memories:
+        if not self.memories or self._emb_matrix is None:
             return []
 
-        query_emb = np.array(query_embedding)
-        
-        # Calculate cosine similarities
-        scores = []
-        for mem in self.memories:
-            if mem.embedding:
-                mem_emb = np.array(mem.embedding)
-                scores.append(np.dot(query_emb, mem_emb) / (np.linalg.norm(query_emb) * np.linalg.norm(mem_emb)))
-            else:
-                scores.append(0)
+        query_emb = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_emb)
+        if query_norm == 0:
+            return []
+
+        # Rows are unit-length, so one matrix-vector product gives every cosine similarity
+        scores = self._emb_matrix[:len(self.memories)] @ (query_emb / query_norm)
         
-        # Get top_k results
-        top_indices = np.argsort(scores)[-top_k:][::-1]
+        # Get top_k results: partial selection, then sort only those
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        top_indices = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
         
         return [self.memories[i] for i in top_indices if scores[i] > 0]
@@ -0,0 +1,18 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module if orjson isn't installed
+    orjson = None
+
+def loads(data: bytes | str):
+    """Parses JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_line(obj: dict) -> bytes:
+    """Serializes an object as one newline-terminated JSONL record."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return (json.dumps(obj, ensure_ascii=False, default=str) + "\n").encode('utf-8')
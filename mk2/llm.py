@@ -1,6 +1,19 @@
 from ollama import Client
 import json
 
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib parser if orjson isn't installed
+    orjson = None
+
+def _parse_json(content: str) -> dict:
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass  # Let the stdlib parser have a go (it accepts NaN/Infinity, for example)
+    return json.loads(content)
+
 class LLMBackend:
     """A simple wrapper for the Ollama API client."""
     def __init__(self, model_name: str, host: str = "http://localhost:11434"):
@@ -20,21 +33,13 @@ class LLMBackend:
                 options={"temperature": temperature}
             )
             
-            # Robust JSON parsing from the main content
-            content = response['message']['content']
-            parsed_json = {}
+            # format="json" makes Ollama return a single JSON object, so the content parses as-is
             try:
-                json_start = content.find('{')
-                json_end = content.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    json_str = content[json_start:json_end]
-                    parsed_json = json.loads(json_str)
-                else:
-                    # Handle cases where no JSON is found
-                    parsed_json = {"error": "No JSON object found in the response"}
+                parsed_json = _parse_json(response['message']['content'])
+                if not isinstance(parsed_json, dict):
+                    parsed_json = {"error": "The response is not a JSON object"}
             except json.JSONDecodeError:
-                 parsed_json = {"error": "Failed to decode JSON from the response"}
-
+                parsed_json = {"error": "Failed to decode JSON from the response"}
 
             # Add the 'thinking' part to our final dictionary if it exists
             if 'thinking' in response['message']:
@@ -9,10 +9,11 @@ from models import MODELS
 from schemas import ConversationTurn
 from sota_socket_interface import SotaSocket
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Constants ---
 PERSONALITY_FILE = os.path.join("data", "potato_personality.json")
-MEMORY_FILE = os.path.join("data", "episodic_memory.json")
+MEMORY_FILE = os.path.join("data", "episodic_memory.jsonl")
 REFLECTION_INTERVAL = 10 # Reflect after every 10 turns
 
 def main():
@@ -44,6 +45,28 @@ def main():
         print(f" An unexpected error occurred during initialization: {e}")
         return
 
+    def post_turn_work(current_turn, turn_number):
+        """Curates the turn into a memory and reflects every REFLECTION_INTERVAL turns."""
+        try:
+            new_memory_entry = curator.curate_memory_entry(current_turn, turn_number)
+            if new_memory_entry:
+                memory_manager.add_memory(new_memory_entry)
+
+            if turn_number % REFLECTION_INTERVAL == 0:
+                recent_memories = memory_manager.get_recent_memories(REFLECTION_INTERVAL)
+                proposal = reflector.reflect_and_propose_change(char_manager.get_persona_json(), recent_memories)
+
+                if proposal:
+                    # Replace the belief in place and save the updated persona back to the file
+                    char_manager.update_core_belief(proposal['belief_to_update'], proposal['new_belief'])
+        except Exception as e:
+            print(f"Post-turn work for turn {turn_number} failed: {e}")
+
+    # Curation and reflection are LLM calls of their own; running them on one worker lets the
+    # loop go straight back to waiting for Sota, and keeps them in turn order (a reflection
+    # sees every memory curated before it) without two of them hitting Ollama at once
+    background_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+
     print("\n--- Potato Bot is Ready ---")
     print("Type 'quit' or 'exit' to end the chat.")
     
@@ -117,40 +140,20 @@ def main():
 
 
             # --- Post-Response Processing ---
-            # 6. Curate a new memory from this turn
+            # 6. Curate a new memory from this turn and 7. reflect if it's time, in the background
             current_turn = [
                 ConversationTurn(speaker="User", message=user_input),
                 ConversationTurn(speaker="Potato", message=final_message)
             ]
-            new_memory_entry = curator.curate_memory_entry(current_turn, turn_number)
-            if new_memory_entry:
-                memory_manager.add_memory(new_memory_entry)
-
-            # 7. Check if it's time to reflect
-            if turn_number % REFLECTION_INTERVAL == 0:
-                recent_memories = memory_manager.get_recent_memories(REFLECTION_INTERVAL)
-                proposal = reflector.reflect_and_propose_change(char_manager.persona, recent_memories)
-                
-                if proposal:
-                    # Update the in-memory persona dictionary
-                    current_persona_dict = char_manager.persona.dict()
-                    belief_to_update = proposal['belief_to_update']
-                    new_belief = proposal['new_belief']
-
-                    # Find and replace the belief
-                    for i, belief in enumerate(current_persona_dict['character']['core_beliefs']):
-                        if belief == belief_to_update:
-                            current_persona_dict['character']['core_beliefs'][i] = new_belief
-                            break
-                    
-                    # Save the updated persona back to the file
-                    char_manager.update_and_save_persona(current_persona_dict)
+            background_pool.submit(post_turn_work, current_turn, turn_number)
     
     except KeyboardInterrupt:
         print("\n--- User interrupted. Shutting down. ---")
     finally:
         print("--- Closing connection to Sota. ---")
         sota_client.close()
+        print("--- Waiting for memory curation to finish. ---")
+        background_pool.shutdown(wait=True)
 
 
 if __name__ == "__main__":
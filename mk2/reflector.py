@@ -1,5 +1,5 @@
 from typing import List, Dict, Any
-from schemas import CorePersona, EpisodicMemoryEntry
+from schemas import EpisodicMemoryEntry
 from llm import LLMBackend
 
 # The "Therapist" prompt for the Reflector LLM
@@ -32,9 +32,10 @@ class Reflector:
         # The Reflector might need a more powerful model to do its reasoning.
         self.llm = llm_backend
 
-    def reflect_and_propose_change(self, persona: CorePersona, recent_memories: List[EpisodicMemoryEntry]) -> Dict[str, Any] | None:
+    def reflect_and_propose_change(self, persona_json: str, recent_memories: List[EpisodicMemoryEntry]) -> Dict[str, Any] | None:
         """
         Uses an LLM to analyze memories and propose a change to the persona.
+        `persona_json` is the serialized persona (CharacterManager.get_persona_json()).
         """
         print("\n--- スローリフレクションを開始... ---")
 
@@ -43,12 +44,10 @@ class Reflector:
             return None
 
         # Prepare the context for the LLM
-        prompt_context = "**Core Persona for Analysis:**\n"
-        prompt_context += persona.json(indent=2)
-        
-        prompt_context += "\n\n**Recent Episodic Memories for Analysis:**\n"
+        parts = ["**Core Persona for Analysis:**\n", persona_json, "\n\n**Recent Episodic Memories for Analysis:**\n"]
         for mem in recent_memories:
-            prompt_context += f"- Turn {mem.turn_number}: {mem.curated_memory} (Valence: {mem.emotional_valence})\n"
+            parts.append(f"- Turn {mem.turn_number}: {mem.curated_memory} (Valence: {mem.emotional_valence})\n")
+        prompt_context = "".join(parts)
         
         # Call the LLM with the powerful prompt
         response_json = self.llm.call(
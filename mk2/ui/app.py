@@ -22,7 +22,9 @@ _script_dir = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(_script_dir, "..", "data")
 TEMPLATES_DIR = os.path.join(_script_dir, "..", "templates")
 PERSONALITY_FILE = os.path.join(DATA_DIR, "potato_personality.json")
-MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.json")
+MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.jsonl")
+# Memories used to be one JSON array; older templates still ship it (EpisodicMemoryManager migrates it)
+LEGACY_MEMORY_FILE = os.path.join(DATA_DIR, "episodic_memory.json")
 BACKSTORY_FILE = os.path.join(DATA_DIR, "backstory.txt")
 KB_EMBEDDINGS_FILE = os.path.join(DATA_DIR, "kb_embeddings.pkl")
 REFLECTION_INTERVAL = 10 
@@ -202,21 +204,17 @@ class PotatoBot:
     def trigger_reflection(self, debug_log):
         """Triggers the slow reflection process."""
         recent_memories = self.memory_manager.get_recent_memories(REFLECTION_INTERVAL)
-        proposal = self.reflector.reflect_and_propose_change(self.char_manager.persona, recent_memories)
+        proposal = self.reflector.reflect_and_propose_change(self.char_manager.get_persona_json(), recent_memories)
         
         if proposal:
             debug_log.append(f"Reflector proposed an update: '{proposal.get('new_belief')}'")
-            current_persona_dict = self.char_manager.persona.dict()
             belief_to_update = proposal['belief_to_update']
             new_belief = proposal['new_belief']
 
-            for i, belief in enumerate(current_persona_dict['character']['core_beliefs']):
-                if belief == belief_to_update:
-                    current_persona_dict['character']['core_beliefs'][i] = new_belief
-                    break
-            
-            self.char_manager.update_and_save_persona(current_persona_dict)
-            debug_log.append("Core persona has been updated.")
+            if self.char_manager.update_core_belief(belief_to_update, new_belief):
+                debug_log.append("Core persona has been updated.")
+            else:
+                debug_log.append("Proposed belief to update was not found in the persona.")
         else:
             debug_log.append("Reflector did not propose any changes.")
 
@@ -248,8 +246,9 @@ def get_templates():
     """Returns a list of available template names."""
     if not os.path.exists(TEMPLATES_DIR):
         return jsonify([])
-    templates = [d for d in os.listdir(TEMPLATES_DIR) if os.path.isdir(os.path.join(TEMPLATES_DIR, d))]
-    return jsonify(sorted(templates))
+    with os.scandir(TEMPLATES_DIR) as entries:
+        templates = sorted(entry.name for entry in entries if entry.is_dir())
+    return jsonify(templates)
 
 @app.route("/templates/save", methods=["POST"])
 def save_template():
@@ -265,7 +264,8 @@ def save_template():
     try:
         os.makedirs(template_path)
         shutil.copy(PERSONALITY_FILE, template_path)
-        shutil.copy(MEMORY_FILE, template_path)
+        if os.path.exists(MEMORY_FILE):
+            shutil.copy(MEMORY_FILE, template_path)
         # Also save the knowledge base embeddings
         if os.path.exists(KB_EMBEDDINGS_FILE):
             shutil.copy(KB_EMBEDDINGS_FILE, template_path)
@@ -288,8 +288,9 @@ def load_template():
         # --- Explicitly delete current data files to ensure a clean slate ---
         if os.path.exists(PERSONALITY_FILE):
             os.remove(PERSONALITY_FILE)
-        if os.path.exists(MEMORY_FILE):
-            os.remove(MEMORY_FILE)
+        for memory_data_file in (MEMORY_FILE, LEGACY_MEMORY_FILE):
+            if os.path.exists(memory_data_file):
+                os.remove(memory_data_file)
         if os.path.exists(KB_EMBEDDINGS_FILE):
             os.remove(KB_EMBEDDINGS_FILE)
 
@@ -300,7 +301,12 @@ def load_template():
 
         # Copy all files from the template to the data directory
         shutil.copy(template_personality_file, DATA_DIR)
-        shutil.copy(template_memory_file, DATA_DIR)
+        if os.path.exists(template_memory_file):
+            shutil.copy(template_memory_file, DATA_DIR)
+        else:
+            template_legacy_memory_file = os.path.join(template_path, os.path.basename(LEGACY_MEMORY_FILE))
+            if os.path.exists(template_legacy_memory_file):
+                shutil.copy(template_legacy_memory_file, DATA_DIR)
         
         # The embeddings file might not exist in older templates, so copy only if it's there
         if os.path.exists(template_embeddings_file):